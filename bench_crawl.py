@@ -0,0 +1,121 @@
+"""
+Benchmark the main.py sweep end to end against the local fake dsrdata server.
+
+    python3 bench_crawl.py --markets 15000 --workers 1,4,8 --rate 20 --latency 0.05
+
+Reports requests, splits, truncated leaves, coverage of the synthetic population,
+duplicates dropped and wall time for each worker count. Runs in a temporary folder,
+so output/, logs/ and the response cache are left alone.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+
+import pandas as pd
+from rich import print
+from rich.table import Table
+
+from dedup import KEY_COLUMNS, MarketDeduper
+from fake_dsrdata import FakeDsrServer
+from logger import setup_logging, shutdown_logging
+from planner import ALL_STATES, Partition
+from ratelimit import TokenBucket
+from session import SessionManager
+
+
+def expected_keys(server, min_dsr, max_dsr):
+    criteria = {
+        'prop_type_code': {'val': 'H'},
+        'dsr': {'min': str(min_dsr), 'max': str(max_dsr)},
+        'renters': {'min': '0', 'max': '100'},
+    }
+    return {(m['st'], m['pc'], m['pt'], m['lo']) for m in server.expected_markets(criteria)}
+
+
+def crawl(crawler, server, workers, rate, burst, folder):
+    crawler.COUNT = 0
+    crawler.RESPONSE_CACHE = None
+    crawler.LIMITER = TokenBucket(rate=rate, burst=burst)
+    cookies_path = os.path.join(folder, 'cookies.json')
+    with open(cookies_path, 'w') as f:
+        json.dump([{'name': 'JSESSIONID', 'value': 'bench'}], f)
+    crawler.SESSION = SessionManager(crawler.BASE_URL, crawler.HEADERS, cookies_path=cookies_path, pool_size=workers,
+                                     limiter=crawler.LIMITER, cache_path=os.path.join(folder, 'session.json'))
+    if not crawler.is_logged_in():
+        raise SystemExit("Fake server rejected the bench session")
+
+    filename = os.path.join(folder, f"markets_bench_{workers}.csv")
+    root = Partition(ALL_STATES, crawler.MIN_DSR, crawler.MAX_DSR, 0, 100)
+    deduper = MarketDeduper()
+    server.reset_stats()
+    started = time.perf_counter()
+    report = crawler.run_sweep(filename, filename + '.journal', root, deduper=deduper, workers=workers)
+    elapsed = time.perf_counter() - started
+
+    found = pd.read_csv(filename, usecols=list(KEY_COLUMNS), dtype=str, keep_default_na=False)
+    return report, deduper, set(found.itertuples(index=False, name=None)), elapsed
+
+
+def run(markets, worker_counts, rate, burst, latency, error_rate, seed):
+    server = FakeDsrServer(markets=markets, seed=seed, latency=latency, error_rate=error_rate).start()
+    # main reads the base URL at import time
+    os.environ['DSRDATA_BASE_URL'] = server.url
+    import main as crawler
+
+    expected = expected_keys(server, crawler.MIN_DSR, crawler.MAX_DSR)
+    results = []
+    cwd = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            os.chdir(folder)
+            setup_logging(os.path.join(folder, 'events.jsonl'), console=False)
+            try:
+                for workers in worker_counts:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        report, deduper, found, elapsed = crawl(crawler, server, workers, rate, burst, folder)
+                    calls = server.stats['calls']['getMatchingMkts.json']
+                    results.append([
+                        str(workers), str(calls), str(report.splits), str(len(report.truncated)),
+                        f"{len(found):,}", f"{len(found & expected) / max(1, len(expected)):.2%}",
+                        str(len(found - expected)), str(deduper.duplicates), str(server.stats['errors']),
+                        f"{elapsed:.2f}", f"{calls / elapsed:.1f}",
+                    ])
+            finally:
+                shutdown_logging()
+    finally:
+        os.chdir(cwd)
+        server.stop()
+    return len(expected), results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the market sweep against a local fake dsrdata server.")
+    parser.add_argument("--markets", type=int, default=15000, help="Size of the synthetic market population. Default: 15000")
+    parser.add_argument("--workers", type=str, default="1,4,8", help="Comma separated worker counts to compare. Default: 1,4,8")
+    parser.add_argument("--rate", type=float, default=20, help="Requests per second across all workers. Default: 20")
+    parser.add_argument("--burst", type=int, default=4, help="Token bucket size. Default: 4")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds added to every request. Default: 0.05")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of a 429 per request. Default: 0")
+    parser.add_argument("--seed", type=int, default=0, help="Population and error seed. Default: 0")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    worker_counts = [int(workers) for workers in args.workers.split(',')]
+    expected, results = run(args.markets, worker_counts, args.rate, args.burst, args.latency, args.error_rate, args.seed)
+    table = Table(title=f"Sweep benchmark: {expected:,} matching markets, rate {args.rate}/s, latency {args.latency}s")
+    for column in ('Workers', 'Requests', 'Splits', 'Truncated', 'Markets', 'Coverage', 'Unexpected',
+                   'Duplicates', '429s', 'Seconds', 'Req/s'):
+        table.add_column(column, justify='right')
+    for row in results:
+        table.add_row(*row)
+    print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark SheetManager against the local fake Sheets API.
+
+    python3 bench_sheets.py --sizes 1000,10000,50000 --latency 0.05 --error-rate 0.01
+
+Reports API calls, bytes sent/received and wall time for a full upload, a keyed
+delta sync and a two-tab batched sync of synthetic market tables.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from rich import print
+from rich.table import Table
+
+from fake_sheets import FakeSheetsServer
+from logger import setup_logging, shutdown_logging
+from sheet import KEY_COLUMNS, SheetManager
+from sinks import MARKET_COLUMNS
+
+
+def synthetic_markets(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'State': rng.choice(['ACT', 'NSW', 'NT', 'QLD', 'SA', 'TAS', 'VIC', 'WA'], rows),
+        'Post Code': [f"{code:04d}" for code in range(rows)],
+        'Property Type': 'H',
+        'Suburb': [f"Suburb {i}" for i in range(rows)],
+    })
+    for column in MARKET_COLUMNS[4:]:
+        df[column] = rng.random(rows).round(3) * 100
+    df.loc[rng.random(rows) < 0.05, 'Auction clearance rate'] = np.nan
+    return df
+
+
+def changed_markets(df, fraction=0.01, added=0.005, seed=1):
+    rng = np.random.default_rng(seed)
+    df = df.copy()
+    moved = rng.random(len(df)) < fraction
+    df.loc[moved, 'Demand to Supply Ratio'] += 1
+    extra = synthetic_markets(max(1, int(len(df) * added)), seed=seed)
+    extra['Post Code'] = [f"X{i}" for i in range(len(extra))]
+    return pd.concat([df, extra], ignore_index=True)
+
+
+def measure(server, scenario, size, action):
+    server.reset_stats()
+    started = time.perf_counter()
+    action()
+    elapsed = time.perf_counter() - started
+    stats = server.stats
+    return [scenario, f"{size:,}", str(sum(stats['calls'].values())), f"{stats['bytes_in'] / 1024:,.0f}",
+            f"{stats['bytes_out'] / 1024:,.0f}", str(stats['errors']), f"{elapsed:.2f}"]
+
+
+def run(sizes, latency, error_rate, chunk_rows, writes_per_minute):
+    server = FakeSheetsServer(latency=latency, error_rate=error_rate, seed=0).start()
+    results = []
+    events = tempfile.TemporaryDirectory()
+    setup_logging(os.path.join(events.name, 'events.jsonl'), console=False)
+    try:
+        for size in sizes:
+            manager = SheetManager("DSR Data", api_endpoint=server.url, sheet_id=server.create_spreadsheet(),
+                                   chunk_rows=chunk_rows, writes_per_minute=writes_per_minute)
+            df = synthetic_markets(size)
+            updated = changed_markets(df)
+            lookup = updated.loc[:, ['Suburb', 'State', 'Post Code', 'Property Type']]
+
+            results.append(measure(server, 'full upload', size, lambda: manager.log_dataframe(df, 'dsr_data')))
+            results.append(measure(server, 'delta sync', size,
+                                   lambda: manager.upsert_to_sheet(updated, 'dsr_data', KEY_COLUMNS, use_cache=False)))
+
+            def two_tab_sync():
+                existing = manager.get_existing_data('lookup_data', use_cache=False)
+                keys = lookup.loc[:, list(KEY_COLUMNS)].astype(str).apply(tuple, axis=1)
+                with manager.batch_writes():
+                    manager.upsert_to_sheet(updated, 'dsr_data', KEY_COLUMNS)
+                    manager.append_dataframe(lookup[~keys.isin(existing)], 'lookup_data')
+            results.append(measure(server, 'two-tab sync', size, two_tab_sync))
+    finally:
+        server.stop()
+        shutdown_logging()
+        events.cleanup()
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark SheetManager against a local fake Sheets API.")
+    parser.add_argument("--sizes", type=str, default="1000,10000,50000", help="Comma separated row counts. Default: 1000,10000,50000")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every API call. Default: 0")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of a 429 per call. Default: 0")
+    parser.add_argument("--chunk-rows", type=int, default=5000, help="SheetManager upload chunk size. Default: 5000")
+    parser.add_argument("--writes-per-minute", type=int, default=6000, help="SheetManager write quota. Default: 6000")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+    results = run(sizes, args.latency, args.error_rate, args.chunk_rows, args.writes_per_minute)
+    table = Table(title="SheetManager benchmark")
+    for column in ('Scenario', 'Rows', 'API calls', 'KB sent', 'KB received', '429s', 'Seconds'):
+        table.add_column(column, justify='left' if column == 'Scenario' else 'right')
+    for row in results:
+        table.add_row(*row)
+    print(table)
+
+
+if __name__ == "__main__":
+    main()
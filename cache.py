@@ -0,0 +1,175 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+class CacheMiss(Exception):
+    """
+    Raised in offline (cache-only) mode when an entry is missing or expired.
+    """
+
+
+class DiskCache:
+    """
+    Content-addressed on-disk cache. Entries live in `folder` as <sha256>.bin files;
+    the file mtime is the time the entry was stored (for the TTL) and the atime is
+    the last hit (for LRU eviction once the folder grows past max_bytes).
+    """
+
+    def __init__(self, folder, ttl=None, max_bytes=512 * 1024 * 1024, offline=False):
+        self.folder = folder
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+        self.size = sum(entry.stat().st_size for entry in self._entries())
+
+    def _entries(self):
+        return [entry for entry in os.scandir(self.folder) if entry.name.endswith('.bin')]
+
+    def key(self, parts):
+        blob = json.dumps(parts, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.folder, f"{key}.bin")
+
+    def is_fresh(self, key):
+        """
+        True when key is stored and within the TTL, without reading or touching it.
+        """
+        try:
+            stored = os.stat(self.path(key)).st_mtime
+        except FileNotFoundError:
+            return False
+        return self.ttl is None or time.time() - stored <= self.ttl
+
+    def get(self, key):
+        """
+        Return the cached bytes for key, or None on a miss or an expired entry.
+        """
+        path = self.path(key)
+        try:
+            stat = os.stat(path)
+            if self.ttl is not None and time.time() - stat.st_mtime > self.ttl:
+                data = None
+            else:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                os.utime(path, (time.time(), stat.st_mtime))
+        except FileNotFoundError:
+            data = None
+        if data is None and self.offline:
+            raise CacheMiss(f"No fresh cache entry for {key} in offline mode")
+        return data
+
+    def put(self, key, data):
+        path = self.path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.folder, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        with self.lock:
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+            self.size += len(data) - old_size
+            if self.size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Least recently used first, down to 90% of the budget so we don't evict on every put
+        entries = sorted(self._entries(), key=lambda entry: entry.stat().st_atime)
+        target = self.max_bytes * 0.9
+        for entry in entries:
+            if self.size <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self.size -= size
+            except FileNotFoundError:
+                pass
+
+
+class ResponseCache(DiskCache):
+    """
+    Cache of raw getMatchingMkts.json responses keyed by the normalized search criteria.
+    """
+
+    def criteria_key(self, json_data):
+        criteria = json_data['request']['criteria']['and'][0]
+        parts = {
+            'state': sorted(criteria['state']['val'].split(',')),
+            'prop_type': criteria['prop_type_code']['val'],
+            'dsr': [float(criteria['dsr']['min']), float(criteria['dsr']['max'])],
+            'renters': [float(criteria['renters']['min']), float(criteria['renters']['max'])],
+        }
+        return self.key(parts)
+
+    def get_response(self, json_data):
+        data = self.get(self.criteria_key(json_data))
+        return data.decode('utf-8') if data is not None else None
+
+    def put_response(self, json_data, body):
+        self.put(self.criteria_key(json_data), body if isinstance(body, bytes) else body.encode('utf-8'))
+
+
+class ChartCache(DiskCache):
+    """
+    Cache of decoded getHistoricalChart images keyed by (locality, state, postCode,
+    propType, statCode). index.json keeps the sha256 of the last image seen for every
+    chart, even after its entry expired or was evicted, so a refetch can tell whether
+    the chart actually changed.
+    """
+
+    def __init__(self, folder, ttl=None, max_bytes=256 * 1024 * 1024, offline=False):
+        super().__init__(folder, ttl=ttl, max_bytes=max_bytes, offline=offline)
+        self.index_path = os.path.join(folder, 'index.json')
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                self.hashes = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.hashes = {}
+        self.changed = []
+
+    def chart_key(self, parts):
+        locality, state, post_code, prop_type, stat_code = parts
+        return self.key({
+            'locality': locality.strip().lower(),
+            'state': state.strip().upper(),
+            'post_code': str(post_code).strip(),
+            'prop_type': prop_type,
+            'stat': stat_code,
+        })
+
+    def get_chart(self, parts):
+        return self.get(self.chart_key(parts))
+
+    def put_chart(self, parts, data):
+        """
+        Store a chart and return 'new', 'changed' or 'unchanged' compared with the
+        last image seen for it. Changed charts are also collected in self.changed.
+        """
+        key = self.chart_key(parts)
+        digest = hashlib.sha256(data).hexdigest()
+        self.put(key, data)
+        with self.lock:
+            previous = self.hashes.get(key)
+            self.hashes[key] = digest
+            if previous is None:
+                return 'new'
+            if previous == digest:
+                return 'unchanged'
+            self.changed.append(parts)
+            return 'changed'
+
+    def save_index(self):
+        with self.lock:
+            blob = json.dumps(self.hashes, sort_keys=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.folder, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(blob)
+        os.replace(tmp_path, self.index_path)
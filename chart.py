@@ -1,15 +1,18 @@
-import json
 import os
 import pandas as pd
-from rich import print
 from datetime import datetime
 import requests
+from session import AuthError, SessionManager
+from ratelimit import TokenBucket
+from cache import ChartCache
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import base64
-import time
-import random
-from PIL import Image, ImageDraw
-import glob, math
-from bs4 import BeautifulSoup
+from compositor import IMAGE_FORMATS, MAX_PAGE_PIXELS, WEBP_MAX_SIDE, plan_pages, read_sizes, render_page, save_page
+from PIL import features
+from logger import LOG_PATH, get_logger, level_for, log_event, setup_logging
+from metrics import METRICS, profiled
+from contextlib import nullcontext
+import logging
 
 import argparse
 
@@ -17,10 +20,10 @@ import argparse
 CELL_SIZE = 400            # size of each small image in the grid
 PADDING = 10               # space between images
 COLS = 4                   # number of columns in the grid
-TEMP_FOLDER = "tmp"        # temporary folder for processing
+TEMP_FOLDER = "tmp"        # individual charts, only written with --save-charts
 OUTPUT_FOLDER = "images"   # folder to save final combined images
+BASE_URL = os.environ.get("DSRDATA_BASE_URL", "https://dsrdata.com.au").rstrip("/")
 
-COOKIES = dict()
 HEADERS = {
     'Accept': '*/*',
     'Accept-Language': 'en-US,en;q=0.9',
@@ -35,162 +38,183 @@ HEADERS = {
     'sec-ch-ua-mobile': '?0',
     'sec-ch-ua-platform': '"Linux"',
 }
-ACCESS_TOKEN = None
-
-def make_get_requests(url, params=None, retries=3):
-    global HEADERS, COOKIES
+SESSION = None
+CHART_CACHE = None
+# Shared request budget across download workers, about one request per 4 seconds like the old sleeps
+LIMITER = TokenBucket(rate=0.25, burst=1, jitter=1.0)
+LOG = get_logger('chart')
+METRICS_PATH = os.path.join('logs', 'chart_metrics.json')
+PROFILE_PATH = os.path.join('logs', 'chart.prof')
+
+def make_get_requests(url, params=None):
     """
-    Make a GET request to the specified URL with the given headers and cookies.
+    Make a GET request through the shared session, which paces it through LIMITER,
+    adds the access token and retries 429/5xx with backoff. AuthError propagates.
     """
-    for attempt in range(retries):
-        try:
-            response = requests.get(url, headers=HEADERS, cookies=COOKIES, params=params)
-            print_info(f"GET {url} - {response.status_code}", mtype="INF")
-            response.raise_for_status()  # Raise an error for HTTP errors
-            return response
-        except requests.RequestException as e:
-            print_info(f"Failed to make GET request: {e}", mtype="ERR")
-            return None
+    try:
+        response = SESSION.get(url, params=params)
+        print_info(f"GET {url} - {response.status_code}", mtype="DBG", url=url, params=params, status=response.status_code,
+                   latency_ms=round(response.elapsed.total_seconds() * 1000, 1), bytes=len(response.content))
+        response.raise_for_status()  # Raise an error for HTTP errors
+        return response
+    except requests.RequestException as e:
+        print_info(f"Failed to make GET request: {e}", mtype="ERR")
+        return None
 
 def read_suburbs(filepath):
     df = pd.read_csv(filepath)
     return df.values.tolist()
 
-def print_info(msg, mtype):
-    time_now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    if mtype == "INF":
-        print(f"[blue]{time_now} [INFO] {msg}[/blue]")
-    elif mtype == "WRN":
-        print(f"[yellow]{time_now} [WARNING] {msg}[/yellow]")
-    elif mtype == "ERR":
-        print(f"[red]{time_now} [ERROR] {msg}[/red]")
-    elif mtype == "SUC":
-        print(f"[green]{time_now} [SUCCESS] {msg}[/green]")
+def print_info(msg, mtype, **fields):
+    """
+    Queue a log record; keyword arguments become fields of its JSONL event.
+    """
+    log_event(LOG, level_for(mtype), msg, **fields)
 
 def is_logged_in():
-    global ACCESS_TOKEN
-    url = 'https://dsrdata.com.au/'
-    response = make_get_requests(url)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    email = soup.find('div', class_='email')
-    access_token = soup.find(id='accesstoken')
-    if access_token:
-        ACCESS_TOKEN = access_token.get('value')
-    if email and ACCESS_TOKEN:
-        print_info(f"User is logged in as: {email.text.strip()}", mtype='INF')
-        print_info(f"Access token: {ACCESS_TOKEN}", mtype='INF')
-        return True
-    else:
-        print_info("User is not logged in.", mtype='WRN')
+    try:
+        email = SESSION.validate()
+    except AuthError as e:
+        print_info(f"User is not logged in: {e}", mtype='WRN')
         return False
+    print_info(f"User is logged in as: {email}", mtype='INF')
+    return True
 
+def prop_type_code(propertyType):
+    if 'house' in propertyType.lower():
+        return 'H'
+    elif 'unit' in propertyType.lower():
+        return 'U'
+    raise ValueError(f"Unknown property type: {propertyType}")
 
-def load_cookies_from_json(json_path="cookies.json"):
+def chart_parts(locality, state, postCode, propertyType, statCode='DSR'):
     """
-    Load cookies from a JSON file and return as a dict for requests.
-    Uses print_info to display status messages.
+    Chart cache key parts for one suburb row.
     """
-    if not os.path.exists(json_path):
-        print_info(f"Cookie file '{json_path}' does not exist.", mtype="ERR")
-        return {}
-    try:
-        with open(json_path, "r") as f:
-            cookies_list = json.load(f)
-        cookies_dict = {cookie["name"]: cookie["value"] for cookie in cookies_list}
-        print_info(f"Loaded cookies from '{json_path}'.", mtype="INF")
-        return cookies_dict
-    except Exception as e:
-        print_info(f"Failed to load cookies: {e}", mtype="ERR")
-        return {}
-
-def get_charts(locality, state, postCode, propertyType):
-    if 'house' in propertyType.lower():
-        propType = 'H'
-    elif 'unit' in propertyType.lower():
-        propType = 'U'
-    url = f"https://dsrdata.com.au/DSRWeb/secure/getHistoricalChart.png"
-    params = {
-        'access_token': '04ecc9c2-9fab-480d-a774-f1b71fd7cf44',
-        'state': state.strip(),
-        'postCode': postCode,
-        'locality': locality.strip(),
-        'propTypeCode': propType,
-        'statCode': 'DSR',
-    }
-    response = make_get_requests(url, params=params)
-    if response and response.status_code == 200:
+    return (locality.strip(), state.strip(), postCode, prop_type_code(propertyType), statCode)
+
+def get_charts(locality, state, postCode, propertyType, statCode='DSR', save_folder=None):
+    """
+    Fetch one suburb's chart for statCode, from CHART_CACHE when it holds a fresh copy.
+    Returns the image bytes, or None when the request failed. With save_folder the
+    chart is also written there as a PNG file.
+    """
+    parts = chart_parts(locality, state, postCode, propertyType, statCode)
+    propType = parts[3]
+    img_data = CHART_CACHE.get_chart(parts) if CHART_CACHE else None
+    if img_data is not None:
+        METRICS.inc('charts_total', result='cached')
+        print_info(f"Cache hit for {statCode} chart {locality.strip()}, {state.strip()}, {postCode}", mtype="DBG",
+                   source='cache', chart=parts)
+    else:
+        url = f"{BASE_URL}/DSRWeb/secure/getHistoricalChart.png"
+        params = {
+            'state': state.strip(),
+            'postCode': postCode,
+            'locality': locality.strip(),
+            'propTypeCode': propType,
+            'statCode': statCode,
+        }
+        response = make_get_requests(url, params=params)
+        if not (response and response.status_code == 200):
+            return None
         try:
             img_data = base64.b64decode(response.text)
         except Exception as e:
             img_data = response.content
-
-        if not os.path.exists(TEMP_FOLDER):
-            os.makedirs(TEMP_FOLDER)
-        filename = f"{TEMP_FOLDER}/chart_{locality.strip()}_{state.strip()}_{postCode}_{propType}.png"
-
-        if os.path.exists(filename):
-            os.remove(filename)
-
+        METRICS.inc('charts_total', result='downloaded')
+        if CHART_CACHE and CHART_CACHE.put_chart(parts, img_data) == 'changed':
+            print_info(f"{statCode} chart changed since the last download: {locality.strip()}, {state.strip()}, {postCode}", mtype="INF",
+                       event='chart_changed', chart=parts)
+
+    if save_folder:
+        os.makedirs(save_folder, exist_ok=True)
+        filename = f"{save_folder}/chart_{locality.strip()}_{state.strip()}_{postCode}_{propType}_{statCode}.png"
         with open(filename, "wb") as f:
             f.write(img_data)
-
         print_info(f"Chart saved as '{filename}'.", mtype="SUC")
+    return img_data
 
 
-def combine_images():
-    if not os.path.exists(TEMP_FOLDER):
-        print_info(f"Temporary folder '{TEMP_FOLDER}' does not exist!", mtype="ERR")
-        raise SystemExit(f"Temporary folder '{TEMP_FOLDER}' does not exist!")
-
-    img_paths = glob.glob(f"{TEMP_FOLDER}/*")
-    imgs = [Image.open(f) for f in img_paths]
-    if not imgs:
-        print_info("No images found in temp folder!", mtype="ERR")
-        raise SystemExit("No images found in temp folder!")
-
-    # --- CALCULATE GRID SIZE ---
-    n_imgs = len(imgs)
-    cols = 1
-    rows = n_imgs
-
-    # For vertical layout, only one column, so max width is max of all images, heights are each image's height
-    col_widths = [max(img.width for img in imgs)]
-    row_heights = [img.height for img in imgs]
-
-    # Calculate canvas size
-    canvas_width = col_widths[0] + 2 * PADDING
-    canvas_height = sum(row_heights) + (rows + 1) * PADDING
-
-    # --- CREATE HIGH-RES CANVAS ---
-    canvas = Image.new("RGB", (canvas_width, canvas_height), "white")
-
-    # --- PASTE IMAGES ---
-    y = PADDING
-    for idx, img in enumerate(imgs):
-        # Center image horizontally in the column
-        x_offset = PADDING + (col_widths[0] - img.width) // 2
-        canvas.paste(img, (x_offset, y))
-        y += img.height + PADDING
-
-    # --- SAVE HIGH-RES IMAGE (PNG for lossless quality) ---
+def download_charts(suburbs, stat_codes=('DSR',), workers=4, save_folder=None):
+    """
+    Fetch every (suburb, stat) chart from one queue on a pool of `workers` threads,
+    paced by LIMITER. Failed charts are retried once after the first pass. Returns
+    (charts, failed): chart bytes suburb by suburb with one entry per stat, None where
+    a chart failed, and the failed (suburb, stat) pairs.
+    """
+    jobs = [(suburb, statCode) for suburb in suburbs for statCode in stat_codes]
+    charts = [None] * len(jobs)
+    failed = list(range(len(jobs)))
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        for attempt in ('download', 'retry'):
+            if attempt == 'retry':
+                print_info(f"Retrying {len(failed)} failed charts.", mtype="WRN")
+            pending = {pool.submit(get_charts, *jobs[index][0], statCode=jobs[index][1], save_folder=save_folder): index
+                       for index in failed}
+            failed = []
+            for done, future in enumerate(as_completed(pending), start=1):
+                index = pending[future]
+                (locality, state, postCode, propertyType), statCode = jobs[index]
+                try:
+                    charts[index] = future.result()
+                except AuthError:
+                    raise
+                except Exception as e:
+                    print_info(f"{statCode} chart for {locality}, {state}, {postCode} failed: {e}", mtype="ERR",
+                               event='chart_failed', attempt=attempt, chart=[locality, state, postCode, propertyType, statCode])
+                if charts[index] is not None:
+                    print_info(f"[{done}/{len(pending)}] Retrieved {statCode} chart for {locality}, {state}, {postCode}, {propertyType}", mtype="SUC")
+                else:
+                    failed.append(index)
+            if not failed:
+                break
+    except BaseException:
+        # Ctrl-C, a dead session or any other error: drop the queued downloads
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()
+    METRICS.inc('charts_total', len(failed), result='failed')
+    return charts, [jobs[index] for index in failed]
+
+
+def combine_images(charts, cols=COLS, cell_size=CELL_SIZE, max_pixels=MAX_PAGE_PIXELS,
+                   image_format='png', compress_level=6, workers=os.cpu_count() or 4):
+    """
+    Compose chart images (bytes or paths, in order; None leaves a blank cell) into a
+    `cols` wide grid, split into pages of at most max_pixels. Charts are decoded on
+    `workers` threads and pasted one at a time. Returns the saved page paths.
+    """
+    sources = list(charts)
+    if not any(chart is not None for chart in sources):
+        print_info("No charts to combine!", mtype="ERR")
+        raise SystemExit("No charts to combine!")
+    if image_format == 'webp' and not features.check('webp'):
+        print_info("This Pillow build has no WebP support, use --format png.", mtype="ERR")
+        raise SystemExit("No WebP support")
+
+    # --- PLAN THE GRID FROM THE IMAGE HEADERS ---
+    with METRICS.timer('plan'):
+        pages = plan_pages(read_sizes(sources), cols=cols, cell_size=cell_size, padding=PADDING, max_pixels=max_pixels,
+                           max_side=WEBP_MAX_SIDE if image_format == 'webp' else None)
+
+    # --- PAINT AND SAVE ONE PAGE AT A TIME (lossless PNG or WebP) ---
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"combined_chart_{timestamp}.png"
     if not os.path.exists(OUTPUT_FOLDER):
         os.makedirs(OUTPUT_FOLDER)
-    out_path = os.path.join(OUTPUT_FOLDER, filename)
-    if os.path.exists(out_path):
-        os.remove(out_path)
-    canvas.save(out_path, format="PNG")
-    print_info(f"Saved {out_path}", mtype="SUC")
-
-    # Remove all images in temp folder
-    for f in img_paths:
-        try:
-            os.remove(f)
-        except Exception as e:
-            print_info(f"Failed to remove {f}: {e}", mtype="WRN")
-
-
+    out_paths = []
+    for number, page in enumerate(pages, start=1):
+        suffix = f"_p{number}" if len(pages) > 1 else ""
+        out_path = os.path.join(OUTPUT_FOLDER, f"combined_chart_{timestamp}{suffix}.{image_format}")
+        with METRICS.timer('render'):
+            canvas = render_page(page, sources, workers=workers)
+        with METRICS.timer('encode'):
+            save_page(canvas, out_path, image_format, compress_level)
+        canvas.close()
+        out_paths.append(out_path)
+        print_info(f"Saved {out_path} ({page.width}x{page.height}, {len(page.cells)} charts)", mtype="SUC")
+    return out_paths
 
 
 def parse_args():
@@ -201,37 +225,40 @@ def parse_args():
         default="suburbs.csv",
         help="Input file (csv, xlsx, or xls). Default: suburbs.csv"
     )
+    parser.add_argument("--rate", type=float, default=0.25, help="Requests per second across all workers. Default: 0.25")
+    parser.add_argument("--burst", type=int, default=1, help="Requests allowed back to back before rate limiting. Default: 1")
+    parser.add_argument("--jitter", type=float, default=1.0, help="Random extra delay per request in seconds. Default: 1.0")
+    parser.add_argument("--workers", type=int, default=4, help="Maximum downloads in flight. Default: 4")
+    parser.add_argument("--stats", type=str, default="DSR",
+                        help="Comma separated chart stat codes, e.g. DSR,YIELD,VACANCY,DOM,MEDIAN_12. With several, the combined image has one row per suburb and one column per stat. Default: DSR")
+    parser.add_argument("--cols", type=int, default=COLS, help=f"Charts per row in the combined image. Default: {COLS}")
+    parser.add_argument("--cell-size", type=int, default=CELL_SIZE, help=f"Charts larger than this many pixels on a side are scaled down to fit, 0 keeps native size. Default: {CELL_SIZE}")
+    parser.add_argument("--max-pixels", type=int, default=MAX_PAGE_PIXELS, help=f"Largest page in pixels before the grid is split into more pages. Default: {MAX_PAGE_PIXELS}")
+    parser.add_argument("--format", choices=IMAGE_FORMATS, default="png", help="Combined image format, both lossless. Default: png")
+    parser.add_argument("--compress-level", type=int, choices=range(10), default=6, metavar="0-9", help="Encoder effort, lower is faster and larger. Default: 6")
+    parser.add_argument("--save-charts", action="store_true", help=f"Also write every chart to {TEMP_FOLDER}/")
+    parser.add_argument("--log-file", type=str, default=LOG_PATH, help=f"Rotating JSONL event log. Default: {LOG_PATH}")
+    parser.add_argument("--log-level", type=str.upper, default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="Lowest level shown on the console; the event log always records DEBUG. Default: INFO")
+    parser.add_argument("--quiet", action="store_true", help="Only write the event log, nothing to the console")
+    parser.add_argument("--metrics-file", type=str, default=METRICS_PATH,
+                        help=f"Run metrics written at exit, a Prometheus textfile if it ends in .prom. Default: {METRICS_PATH}")
+    parser.add_argument("--profile", nargs="?", const=PROFILE_PATH, default=None,
+                        help=f"Run under cProfile and dump the stats. Default path: {PROFILE_PATH}")
+    parser.add_argument("--cache-dir", type=str, default=os.path.join(".cache", "charts"), help="Chart cache folder. Default: .cache/charts")
+    parser.add_argument("--cache-ttl", type=float, default=24, help="Hours before a cached chart is downloaded again. Default: 24")
+    parser.add_argument("--cache-max-mb", type=float, default=256, help="Chart cache size limit in MB, least recently used charts are evicted first. Default: 256")
+    parser.add_argument("--no-cache", action="store_true", help="Always download charts and do not store them")
     return parser.parse_args()
 
-def save_to_csv(data, filename='markets.csv'):
-    new_df = pd.DataFrame(data)
-    if os.path.exists(filename):
-        df = pd.read_csv(filename)
-        # Drop all-NA columns to avoid FutureWarning
-        df = df.dropna(axis=1, how='all')
-        new_df = new_df.dropna(axis=1, how='all')
-        if not df.empty and not new_df.empty:
-            df = pd.concat([df, new_df], ignore_index=True)
-        elif df.empty:
-            df = new_df
-        # If new_df is empty, no need to concatenate
-    else:
-        df = new_df
-
-    # Save the DataFrame to the CSV file only if it's not empty
-    if not df.empty:
-        df.to_csv(filename, index=False)
-
-def main():
-    global COOKIES
-    global ACCESS_TOKEN
-    COOKIES = load_cookies_from_json()
-
-    logged_in = is_logged_in()
-    if not logged_in:
-        print_info("User is not logged in. Please update cookies.", mtype="ERR")
-        return
-    args = parse_args()
+def run(args):
+    global SESSION
+    global LIMITER
+    global CHART_CACHE
+    LIMITER = TokenBucket(rate=args.rate, burst=args.burst, jitter=args.jitter)
+    if not args.no_cache:
+        CHART_CACHE = ChartCache(args.cache_dir, ttl=args.cache_ttl * 3600,
+                                 max_bytes=int(args.cache_max_mb * 1024 * 1024))
     input_file = args.input
 
     # Check file extension
@@ -246,19 +273,72 @@ def main():
         return
 
     suburbs = read_suburbs(input_file)
+    stat_codes = [code.strip().upper() for code in args.stats.split(',') if code.strip()]
+
+    # Only log in when some chart has to be downloaded
+    cached = 0
+    total = len(suburbs) * len(stat_codes)
+    if CHART_CACHE:
+        for suburb in suburbs:
+            for statCode in stat_codes:
+                try:
+                    cached += CHART_CACHE.is_fresh(CHART_CACHE.chart_key(chart_parts(*suburb, statCode)))
+                except ValueError:
+                    pass
+        print_info(f"{cached} of {total} charts are cached and fresh.", mtype="INF")
+    if cached < total:
+        SESSION = SessionManager(BASE_URL, HEADERS, pool_size=args.workers, limiter=LIMITER)
+
+        logged_in = is_logged_in()
+        if not logged_in:
+            print_info("User is not logged in. Please update cookies.", mtype="ERR")
+            return
 
     if not os.path.exists(OUTPUT_FOLDER):
         os.makedirs(OUTPUT_FOLDER)
 
-    for suburb in suburbs:
-        locality, state, postCode, propertyType = suburb
-        get_charts(locality, state, postCode, propertyType)
-        random_sleep_duration = random.uniform(2, 5)
-        print_info(f"Retrieved charts for {locality}, {state}, {postCode}, {propertyType}", mtype="SUC")    
-        print_info(f"Sleeping for {random_sleep_duration:.2f} seconds to mimic human behavior.", mtype="INF")
-        time.sleep(random_sleep_duration)
+    try:
+        with METRICS.timer('download'):
+            charts, failed = download_charts(suburbs, stat_codes, workers=args.workers,
+                                             save_folder=TEMP_FOLDER if args.save_charts else None)
+    except AuthError as e:
+        print_info(f"{e}. Update cookies.json and run again, charts fetched so far are cached.", mtype="ERR")
+        return
+    finally:
+        # Keep the hashes of charts fetched before a failure for the next change check
+        if CHART_CACHE:
+            CHART_CACHE.save_index()
+    for (locality, state, postCode, propertyType), statCode in failed:
+        print_info(f"Giving up on {statCode} chart for {locality}, {state}, {postCode}, {propertyType}", mtype="ERR")
+
+    if CHART_CACHE:
+        if CHART_CACHE.changed:
+            print_info(f"{len(CHART_CACHE.changed)} charts changed since the last download:", mtype="INF")
+            for locality, state, postCode, propType, statCode in CHART_CACHE.changed:
+                print_info(f"  {locality}, {state}, {postCode}, {propType}, {statCode}", mtype="INF")
+        else:
+            print_info("No chart changed since the last download.", mtype="INF")
+
+    if len(stat_codes) > 1:
+        # One row per suburb and one column per stat; a failed chart leaves its cell blank
+        rows = [charts[start:start + len(stat_codes)] for start in range(0, len(charts), len(stat_codes))]
+        charts = [chart for row in rows if any(chart is not None for chart in row) for chart in row]
+        cols = len(stat_codes)
+    else:
+        charts = [chart for chart in charts if chart is not None]
+        cols = args.cols
+    combine_images(charts, cols=cols, cell_size=args.cell_size, max_pixels=args.max_pixels,
+                   image_format=args.format, compress_level=args.compress_level)
+
 
-    combine_images()    
+def main():
+    args = parse_args()
+    setup_logging(args.log_file, console=not args.quiet, console_level=getattr(logging, args.log_level))
+    with profiled(args.profile, LOG) if args.profile else nullcontext():
+        try:
+            run(args)
+        finally:
+            METRICS.report(LOG, args.metrics_file)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,53 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_TIMEOUT = (10, 60)  # (connect, read) seconds
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+try:
+    import brotli  # noqa: F401  urllib3 only decodes br when brotli is installed
+    ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    ACCEPT_ENCODING = 'gzip, deflate'
+
+
+class TimeoutSession(requests.Session):
+    """
+    requests.Session that applies a default timeout to every request.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+def create_session(headers=None, cookies=None, pool_size=10, retries=5, backoff=1.0, timeout=DEFAULT_TIMEOUT):
+    """
+    Build a persistent, pooled session shared by every request of a run.
+    429 and 5xx responses are retried with exponential backoff plus jitter, and a
+    Retry-After header from the server takes precedence over the computed delay.
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        backoff_jitter=backoff,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=None,  # getMatchingMkts is a read-only POST, safe to replay
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = TimeoutSession(timeout=timeout)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    if headers:
+        session.headers.update(headers)
+    session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+    if cookies:
+        session.cookies.update(cookies)
+    return session
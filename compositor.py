@@ -0,0 +1,137 @@
+import io
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+# Largest canvas, in pixels, composed at once; about 150 MB for an RGB page
+MAX_PAGE_PIXELS = 50_000_000
+# WebP cannot encode images with a side longer than this
+WEBP_MAX_SIDE = 16383
+IMAGE_FORMATS = ('png', 'webp')
+
+# One placed image: index into the sources, top-left corner and pasted size
+Cell = namedtuple('Cell', 'index x y width height')
+Page = namedtuple('Page', 'width height cells')
+
+
+def open_image(source):
+    """
+    Image.open for a path, a file object or raw image bytes.
+    """
+    return Image.open(io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source)
+
+
+def read_sizes(sources):
+    """
+    Image sizes from the headers only; nothing is decoded and no file stays open.
+    A None source (an empty cell) has no size.
+    """
+    sizes = []
+    for source in sources:
+        if source is None:
+            sizes.append(None)
+            continue
+        with open_image(source) as img:
+            sizes.append(img.size)
+    return sizes
+
+
+def fit_size(size, cell_size=None):
+    """
+    Scale (width, height) down to fit a cell_size square, keeping the aspect ratio.
+    Smaller images and cell_size=None keep their native size.
+    """
+    width, height = size
+    if not cell_size or max(width, height) <= cell_size:
+        return width, height
+    scale = cell_size / max(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def plan_pages(sizes, cols=4, cell_size=None, padding=10, max_pixels=MAX_PAGE_PIXELS, max_side=None):
+    """
+    Lay images out row by row in a `cols` wide grid and break the grid into pages so no
+    canvas exceeds max_pixels, or max_side pixels in height (a page always holds at
+    least one row). Columns share one width across pages; each row is as tall as its
+    tallest image. A None size leaves its cell empty.
+    """
+    fitted = [None if size is None else fit_size(size, cell_size) for size in sizes]
+    if not any(fitted):
+        return []
+    cols = max(1, min(cols, len(fitted)))
+    col_width = max(size[0] for size in fitted if size)
+    page_width = cols * col_width + (cols + 1) * padding
+    if max_side and page_width > max_side:
+        raise ValueError(f"A {cols} column grid is {page_width} pixels wide, over the {max_side} pixel limit")
+
+    pages = []
+    cells = []
+    y = padding
+    for start in range(0, len(fitted), cols):
+        row = fitted[start:start + cols]
+        row_height = max((size[1] for size in row if size), default=0)
+        bottom = y + row_height + padding
+        if cells and (page_width * bottom > max_pixels or (max_side and bottom > max_side)):
+            pages.append(Page(page_width, y, cells))
+            cells = []
+            y = padding
+        for offset, size in enumerate(row):
+            if size is None:
+                continue
+            width, height = size
+            x = padding + offset * (col_width + padding) + (col_width - width) // 2
+            cells.append(Cell(start + offset, x, y, width, height))
+        y += row_height + padding
+    pages.append(Page(page_width, y, cells))
+    return pages
+
+
+def decode_cell(source, cell):
+    """
+    Decode one source image and scale it to its cell, ready to paste.
+    """
+    img = open_image(source)
+    img.load()
+    if img.size != (cell.width, cell.height):
+        img = img.resize((cell.width, cell.height), Image.LANCZOS)
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA')
+    return img
+
+
+def render_page(page, sources, background='white', workers=1):
+    """
+    Paint one page. Images are decoded on `workers` threads (Pillow releases the GIL
+    while decoding) but at most 2 * workers decoded images are held at once.
+    """
+    canvas = Image.new('RGB', (page.width, page.height), background)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        decoding = deque()
+        cells = iter(page.cells)
+        for cell in cells:
+            decoding.append((cell, pool.submit(decode_cell, sources[cell.index], cell)))
+            if len(decoding) >= 2 * workers:
+                break
+        while decoding:
+            cell, future = decoding.popleft()
+            img = future.result()
+            canvas.paste(img, (cell.x, cell.y), img if img.mode == 'RGBA' else None)
+            img.close()
+            following = next(cells, None)
+            if following is not None:
+                decoding.append((following, pool.submit(decode_cell, sources[following.index], following)))
+    return canvas
+
+
+def save_page(canvas, path, image_format='png', compress_level=6):
+    """
+    Encode a page as PNG or lossless WebP. compress_level runs 0-9 for both formats:
+    lower is faster, higher is smaller.
+    """
+    if image_format == 'png':
+        canvas.save(path, format='PNG', compress_level=compress_level)
+    elif image_format == 'webp':
+        canvas.save(path, format='WEBP', lossless=True, quality=round(compress_level * 100 / 9), method=4)
+    else:
+        raise ValueError(f"Unsupported image format: {image_format}")
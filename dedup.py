@@ -0,0 +1,56 @@
+import hashlib
+
+from markets import MarketBatch
+
+# A market is identified by these columns; the stats may differ between overlapping queries
+KEY_COLUMNS = ('State', 'Post Code', 'Property Type', 'Suburb')
+
+
+def market_key(values):
+    """
+    Hash a market identity to a 64-bit int, so the seen-set stays compact for large sweeps.
+    """
+    blob = '\x1f'.join('' if value is None else str(value) for value in values)
+    return int.from_bytes(hashlib.blake2b(blob.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class MarketDeduper:
+    """
+    Drops markets already emitted earlier in the run, before they reach the output.
+    """
+
+    def __init__(self, key_columns=KEY_COLUMNS):
+        self.key_columns = key_columns
+        self.seen = set()
+        self.duplicates = 0
+
+    def add_keys(self, rows):
+        """
+        Mark key tuples (in key_columns order) as seen, e.g. rows already in a resumed file.
+        """
+        for row in rows:
+            self.seen.add(market_key(row))
+
+    def filter(self, records):
+        """
+        Return (unique_records, duplicate_count) for a MarketBatch or a list of record dicts.
+        """
+        if isinstance(records, MarketBatch):
+            keep = []
+            for i, row in enumerate(records.key_rows(self.key_columns)):
+                key = market_key(row)
+                if key not in self.seen:
+                    self.seen.add(key)
+                    keep.append(i)
+            unique = records if len(keep) == len(records) else records.take(keep)
+        else:
+            unique = []
+            for record in records:
+                key = market_key([record.get(column) for column in self.key_columns])
+                if key in self.seen:
+                    continue
+                self.seen.add(key)
+                unique.append(record)
+        duplicates = len(records) - len(unique)
+        self.duplicates += duplicates
+        return unique, duplicates
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+from dedup import KEY_COLUMNS
+from snapshots import STAT_COLUMNS
+
+
+class SnapshotDiff:
+    """
+    Markets added, removed and changed between two snapshots. `changed` holds the
+    current values plus a '<column> delta' column (current - previous) per stat.
+    """
+
+    def __init__(self, added, removed, changed):
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+
+    def __str__(self):
+        return f"{len(self.added)} added, {len(self.removed)} removed, {len(self.changed)} changed"
+
+    def is_empty(self):
+        return self.added.empty and self.removed.empty and self.changed.empty
+
+    def to_frame(self):
+        """
+        One frame with a 'Change' column, for writing or handing to later stages.
+        """
+        frames = [
+            frame.assign(Change=change)
+            for change, frame in (('added', self.added), ('removed', self.removed), ('changed', self.changed))
+            if not frame.empty
+        ]
+        if not frames:
+            return pd.DataFrame(columns=['Change'] + list(KEY_COLUMNS))
+        df = pd.concat(frames, ignore_index=True)
+        return df[['Change'] + [column for column in df.columns if column != 'Change']]
+
+
+def _normalize(df, key_columns, columns):
+    df = df.loc[:, list(key_columns) + list(columns)].copy()
+    for column in key_columns:
+        df[column] = df[column].astype(str)
+    for column in columns:
+        df[column] = pd.to_numeric(df[column], errors='coerce').astype('float64')
+    return df.drop_duplicates(subset=list(key_columns), keep='last')
+
+
+def diff_markets(previous, current, key_columns=KEY_COLUMNS, columns=STAT_COLUMNS):
+    """
+    Compare two market frames joined on the market identity, column by column.
+    NaN on both sides counts as unchanged.
+    """
+    key_columns = list(key_columns)
+    previous = _normalize(previous, key_columns, columns)
+    current = _normalize(current, key_columns, columns)
+    merged = previous.merge(current, on=key_columns, how='outer', suffixes=(' prev', ''), indicator=True)
+
+    added = merged.loc[merged['_merge'] == 'right_only', key_columns + list(columns)]
+    removed = merged.loc[merged['_merge'] == 'left_only', key_columns + [f"{column} prev" for column in columns]]
+    removed = removed.rename(columns={f"{column} prev": column for column in columns})
+
+    both = merged[merged['_merge'] == 'both']
+    current_values = both[list(columns)].to_numpy()
+    previous_values = both[[f"{column} prev" for column in columns]].to_numpy()
+    moved = (current_values != previous_values) & ~(np.isnan(current_values) & np.isnan(previous_values))
+    changed_mask = moved.any(axis=1)
+
+    changed = both.loc[changed_mask, key_columns + list(columns)].copy()
+    deltas = pd.DataFrame(
+        current_values[changed_mask] - previous_values[changed_mask],
+        columns=[f"{column} delta" for column in columns],
+        index=changed.index,
+    )
+    changed = pd.concat([changed, deltas], axis=1)
+    return SnapshotDiff(added.reset_index(drop=True), removed.reset_index(drop=True), changed.reset_index(drop=True))
@@ -0,0 +1,271 @@
+"""
+Local stand-in for the dsrdata.com.au endpoints used by main.py and chart.py:
+the logged-in homepage, getMatchingMkts.json and getHistoricalChart.png.
+
+    server = FakeDsrServer(markets=15000, latency=0.05).start()
+    os.environ['DSRDATA_BASE_URL'] = server.url   # before importing main/chart
+    ...
+    print(server.stats)
+    server.stop()
+
+Any JSESSIONID cookie counts as logged in unless session_id is given. Markets are
+filtered like the real search (states, property type, inclusive DSR and renters
+bounds), sorted by DSR and cut at RESULT_CAP with a warning.
+"""
+import base64
+import hashlib
+import io
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from PIL import Image, ImageDraw
+
+from planner import ALL_STATES, RESULT_CAP
+
+STATE_WEIGHTS = (0.02, 0.30, 0.02, 0.20, 0.08, 0.03, 0.25, 0.10)  # in ALL_STATES order
+FIRST_POST_CODE = {'ACT': 2600, 'NSW': 2000, 'NT': 800, 'QLD': 4000, 'SA': 5000, 'TAS': 7000, 'VIC': 3000, 'WA': 6000}
+
+LOGGED_IN_PAGE = """<!DOCTYPE html>
+<html><head><title>DSR Data</title></head>
+<body>
+<div class="header"><div class="email">{email}</div></div>
+<input type="hidden" id="accesstoken" value="{token}">
+</body></html>
+"""
+LOGIN_PAGE = """<!DOCTYPE html>
+<html><head><title>DSR Data - Login</title></head>
+<body><form action="/login" method="post"><input name="username"><input name="password" type="password"></form></body></html>
+"""
+
+
+def synthetic_population(markets, seed=0):
+    """
+    Market records shaped like getMatchingMkts 'mkt' entries. DSR is an integer and
+    renters has one decimal, so renters bounds shared by sibling buckets do match.
+    """
+    rng = random.Random(seed)
+    population = []
+    for i in range(markets):
+        state = rng.choices(ALL_STATES, weights=STATE_WEIGHTS)[0]
+        dsr = min(85, max(15, round(rng.gauss(52, 9))))
+        stats = {
+            'ACR': round(rng.uniform(30, 90), 1) if rng.random() > 0.3 else None,
+            'DISCOUNT': round(rng.uniform(-10, 2), 1),
+            'DOM': rng.randint(10, 180),
+            'DSR': dsr,
+            'MEDIAN_12': rng.randint(200, 3000) * 1000,
+            'OSI': round(rng.uniform(0.5, 3), 2),
+            'RENTERS': round(rng.betavariate(2, 5) * 100, 1),
+            'SOM_PERC': round(rng.uniform(0.2, 4), 2),
+            'SR': rng.randint(50, 100),
+            'TV': rng.randint(200, 3000) * 1000,
+            'VACANCY': round(rng.uniform(0.2, 5), 2),
+            'YIELD': round(rng.uniform(2, 8), 2),
+        }
+        population.append({
+            'st': state,
+            'pc': str(FIRST_POST_CODE[state] + i % 900).zfill(4),
+            'pt': 'H' if rng.random() < 0.8 else 'U',
+            'lo': f"SUBURB {i}",
+            'mkt_stats': stats,
+        })
+    return population
+
+
+def matches(market, criteria):
+    """
+    Apply one getMatchingMkts 'and' clause the way the site does: all bounds inclusive.
+    """
+    stats = market['mkt_stats']
+    states = criteria.get('state', {}).get('val', ','.join(ALL_STATES)).split(',')
+    prop_type = criteria.get('prop_type_code', {}).get('val')
+    if market['st'] not in states or (prop_type and market['pt'] != prop_type):
+        return False
+    for name, stat in (('dsr', 'DSR'), ('renters', 'RENTERS')):
+        bounds = criteria.get(name)
+        if bounds and not float(bounds['min']) <= stats[stat] <= float(bounds['max']):
+            return False
+    return True
+
+
+def render_chart(params, size=(800, 400)):
+    """
+    Deterministic line chart PNG for one chart request.
+    """
+    key = json.dumps(sorted(params.items())).encode('utf-8')
+    rng = random.Random(hashlib.sha256(key).digest())
+    image = Image.new('RGB', size, 'white')
+    draw = ImageDraw.Draw(image)
+    width, height = size
+    draw.rectangle([40, 20, width - 20, height - 40], outline='black')
+    value = rng.uniform(0.3, 0.7)
+    points = []
+    for i in range(60):
+        value = min(0.95, max(0.05, value + rng.gauss(0, 0.04)))
+        points.append((40 + i * (width - 60) / 59, 20 + (1 - value) * (height - 60)))
+    draw.line(points, fill='navy', width=2)
+    draw.text((50, 25), f"{params.get('locality', '')} {params.get('statCode', '')}", fill='black')
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class FakeDsrServer:
+    """
+    Threaded localhost server. latency is added to every request; error_rate is the
+    probability of answering 429, and fail_next(n) forces the next n requests to 429.
+    expire_token() invalidates the current access token, like a session timing out.
+    stats counts calls per endpoint plus request/response bytes.
+    """
+
+    def __init__(self, markets=15000, seed=0, host='127.0.0.1', port=0, latency=0.0, error_rate=0.0,
+                 session_id=None, email='bench@example.com'):
+        self.population = synthetic_population(markets, seed)
+        self.by_state = {state: [m for m in self.population if m['st'] == state] for state in ALL_STATES}
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.session_id = session_id
+        self.email = email
+        self.token = str(uuid.uuid4())
+        self.charts = {}
+        self.lock = threading.Lock()
+        self.forced_errors = 0
+        self.reset_stats()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reset_stats(self):
+        self.stats = {'calls': Counter(), 'bytes_in': 0, 'bytes_out': 0, 'errors': 0}
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def fail_next(self, count=1):
+        self.forced_errors += count
+
+    def expire_token(self):
+        self.token = str(uuid.uuid4())
+
+    def expected_markets(self, criteria):
+        """
+        Every market a complete sweep of `criteria` should find, ignoring the cap.
+        """
+        return [market for market in self.population if matches(market, criteria)]
+
+    def logged_in(self, cookie_header):
+        cookie = SimpleCookie(cookie_header or '').get('JSESSIONID')
+        return bool(cookie and cookie.value) and self.session_id in (None, cookie.value)
+
+    def home(self, cookie_header):
+        if not self.logged_in(cookie_header):
+            return 200, 'text/html', LOGIN_PAGE.encode('utf-8')
+        return 200, 'text/html', LOGGED_IN_PAGE.format(email=self.email, token=self.token).encode('utf-8')
+
+    def matching_markets(self, body):
+        criteria = body['request']['criteria']['and'][0]
+        states = criteria.get('state', {}).get('val', ','.join(ALL_STATES)).split(',')
+        found = [market for state in states for market in self.by_state.get(state, ()) if matches(market, criteria)]
+        found.sort(key=lambda market: market['mkt_stats']['DSR'], reverse=True)
+        response = {}
+        if len(found) > RESULT_CAP:
+            response['warnings'] = {'WRN': f"Only the first {RESULT_CAP} of {len(found)} matching markets are shown."}
+            found = found[:RESULT_CAP]
+        if found:
+            # A lone market comes back as an object rather than a one-element list
+            response['mkt'] = found[0] if len(found) == 1 else found
+        return 200, 'application/json', json.dumps({'response': response}).encode('utf-8')
+
+    def historical_chart(self, query):
+        params = {name: values[0] for name, values in query.items() if name != 'access_token'}
+        key = tuple(sorted(params.items()))
+        with self.lock:
+            png = self.charts.get(key)
+        if png is None:
+            png = render_chart(params)
+            with self.lock:
+                self.charts[key] = png
+        # The site sends the PNG base64 encoded with an image content type
+        return 200, 'image/png', base64.b64encode(png)
+
+    def dispatch(self, method, url, headers, body):
+        """
+        Route one request; returns (endpoint name, status, content type, body bytes).
+        """
+        query = parse_qs(url.query)
+        if url.path == '/':
+            return ('home',) + self.home(headers.get('Cookie'))
+        endpoint = url.path.rsplit('/', 1)[-1]
+        if endpoint not in ('getMatchingMkts.json', 'getHistoricalChart.png'):
+            return endpoint, 404, 'text/plain', b'Not Found'
+        if not self.logged_in(headers.get('Cookie')) or query.get('access_token', [None])[0] != self.token:
+            return endpoint, 401, 'application/json', b'{"error": "invalid_token"}'
+        if endpoint == 'getMatchingMkts.json' and method == 'POST':
+            return (endpoint,) + self.matching_markets(json.loads(body))
+        if endpoint == 'getHistoricalChart.png':
+            return (endpoint,) + self.historical_chart(query)
+        return endpoint, 405, 'text/plain', b'Method Not Allowed'
+
+    def _should_fail(self):
+        with self.lock:
+            if self.forced_errors:
+                self.forced_errors -= 1
+                return True
+            return self.error_rate and self.random.random() < self.error_rate
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def handle_request(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                raw = self.rfile.read(length) if length else b''
+                if server.latency:
+                    time.sleep(server.latency)
+                url = urlparse(self.path)
+                if server._should_fail():
+                    endpoint = url.path.rsplit('/', 1)[-1] or 'home'
+                    status, content_type, data = 429, 'text/plain', b'Too Many Requests'
+                else:
+                    endpoint, status, content_type, data = server.dispatch(self.command, url, self.headers, raw)
+                with server.lock:
+                    server.stats['calls'][endpoint] += 1
+                    server.stats['bytes_in'] += len(raw)
+                    server.stats['bytes_out'] += len(data)
+                    if status != 200:
+                        server.stats['errors'] += 1
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                if status == 429:
+                    self.send_header('Retry-After', '1')
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = handle_request
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
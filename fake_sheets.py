@@ -0,0 +1,323 @@
+"""
+Local stand-in for the subset of the Google Sheets v4 API that SheetManager uses:
+spreadsheets.get/create/batchUpdate and values.get/batchGet/update/clear/batchUpdate.
+
+    server = FakeSheetsServer(latency=0.05, error_rate=0.01).start()
+    manager = SheetManager("DSR Data", api_endpoint=server.url, sheet_id=server.create_spreadsheet())
+    ...
+    print(server.stats)
+    server.stop()
+"""
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+CELL_RE = re.compile(r'^([A-Za-z]*)(\d*)$')
+
+
+def column_index(letters):
+    index = 0
+    for letter in letters.upper():
+        index = index * 26 + ord(letter) - 64
+    return index - 1
+
+
+def parse_range(a1):
+    """
+    'Sheet!B2:D' -> ('Sheet', 1, 1, None, 3): zero-based inclusive bounds, None when open.
+    """
+    sheet, _, cells = a1.rpartition('!') if '!' in a1 else (a1, '', '')
+    sheet = sheet.strip("'")
+    if not cells:
+        return sheet, 0, 0, None, None
+    start, _, end = cells.partition(':')
+    col0, row0 = CELL_RE.match(start).groups()
+    r0 = int(row0) - 1 if row0 else 0
+    c0 = column_index(col0) if col0 else 0
+    if not end:
+        return sheet, r0, c0, r0 if row0 else None, c0 if col0 else None
+    col1, row1 = CELL_RE.match(end).groups()
+    return sheet, r0, c0, int(row1) - 1 if row1 else None, column_index(col1) if col1 else None
+
+
+class ApiError(Exception):
+    def __init__(self, code, status, message):
+        super().__init__(message)
+        self.code = code
+        self.status = status
+
+
+class Tab:
+    def __init__(self, sheet_id, title):
+        self.sheet_id = sheet_id
+        self.title = title
+        self.rows = []
+
+    def properties(self):
+        width = max((len(row) for row in self.rows), default=0)
+        return {
+            'sheetId': self.sheet_id,
+            'title': self.title,
+            'gridProperties': {'rowCount': max(1000, len(self.rows)), 'columnCount': max(26, width)},
+        }
+
+    def write(self, r0, c0, values):
+        for r, row in enumerate(values, start=r0):
+            while len(self.rows) <= r:
+                self.rows.append([])
+            target = self.rows[r]
+            if len(target) < c0 + len(row):
+                target.extend([''] * (c0 + len(row) - len(target)))
+            target[c0:c0 + len(row)] = row
+        return sum(len(row) for row in values)
+
+    def clear(self, r0, c0, r1, c1):
+        last_row = len(self.rows) - 1 if r1 is None else min(r1, len(self.rows) - 1)
+        for r in range(r0, last_row + 1):
+            row = self.rows[r]
+            end = len(row) if c1 is None else min(c1 + 1, len(row))
+            for c in range(c0, end):
+                row[c] = ''
+            while row and row[-1] == '':
+                row.pop()
+        while self.rows and not self.rows[-1]:
+            self.rows.pop()
+
+    def delete_rows(self, start, end):
+        del self.rows[start:end]
+
+    def read(self, r0, c0, r1, c1):
+        last_row = len(self.rows) - 1 if r1 is None else min(r1, len(self.rows) - 1)
+        values = []
+        for r in range(r0, last_row + 1):
+            row = self.rows[r][c0:None if c1 is None else c1 + 1]
+            while row and row[-1] == '':
+                row = row[:-1]
+            values.append(row)
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+
+class Spreadsheet:
+    def __init__(self, spreadsheet_id, title):
+        self.spreadsheet_id = spreadsheet_id
+        self.title = title
+        self.tabs = {}
+        self.next_sheet_id = itertools.count(0)
+        self.add_tab('Sheet1')
+
+    def add_tab(self, title):
+        if title in self.tabs:
+            raise ApiError(400, 'INVALID_ARGUMENT', f'A sheet with the name "{title}" already exists.')
+        tab = Tab(next(self.next_sheet_id), title)
+        self.tabs[title] = tab
+        return tab
+
+    def tab(self, title):
+        if title not in self.tabs:
+            raise ApiError(400, 'INVALID_ARGUMENT', f'Unable to parse range: {title}')
+        return self.tabs[title]
+
+    def tab_by_id(self, sheet_id):
+        for tab in self.tabs.values():
+            if tab.sheet_id == sheet_id:
+                return tab
+        raise ApiError(400, 'INVALID_ARGUMENT', f'No grid with id: {sheet_id}')
+
+    def resource(self):
+        return {
+            'spreadsheetId': self.spreadsheet_id,
+            'properties': {'title': self.title},
+            'sheets': [{'properties': tab.properties()} for tab in self.tabs.values()],
+        }
+
+
+class FakeSheetsServer:
+    """
+    Threaded localhost server. latency is added to every request; error_rate is the
+    probability of answering 429, and fail_next(n) forces the next n requests to 429.
+    stats counts calls per operation plus request/response bytes.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.spreadsheets = {}
+        self.lock = threading.RLock()
+        self.forced_errors = 0
+        self.reset_stats()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def reset_stats(self):
+        self.stats = {'calls': Counter(), 'bytes_in': 0, 'bytes_out': 0, 'errors': 0}
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def fail_next(self, count=1):
+        self.forced_errors += count
+
+    def create_spreadsheet(self, title='DSR Data'):
+        with self.lock:
+            spreadsheet = Spreadsheet(uuid.uuid4().hex, title)
+            self.spreadsheets[spreadsheet.spreadsheet_id] = spreadsheet
+        return spreadsheet.spreadsheet_id
+
+    def _spreadsheet(self, spreadsheet_id):
+        if spreadsheet_id not in self.spreadsheets:
+            raise ApiError(404, 'NOT_FOUND', 'Requested entity was not found.')
+        return self.spreadsheets[spreadsheet_id]
+
+    def dispatch(self, method, path, query, body):
+        """
+        Route one API call; returns (operation name, response dict).
+        """
+        parts = path.split('/')[2:]  # drop '' and 'v4'
+        if parts == ['spreadsheets'] and method == 'POST':
+            spreadsheet_id = self.create_spreadsheet(body.get('properties', {}).get('title', 'Untitled'))
+            return 'spreadsheets.create', self.spreadsheets[spreadsheet_id].resource()
+        head = parts[1] if len(parts) > 1 else ''
+        spreadsheet_id, _, action = head.partition(':')
+        spreadsheet = self._spreadsheet(spreadsheet_id)
+        if len(parts) == 2 and action == 'batchUpdate':
+            return 'spreadsheets.batchUpdate', self._batch_update(spreadsheet, body)
+        if len(parts) == 2:
+            return 'spreadsheets.get', spreadsheet.resource()
+        if parts[2] == 'values:batchGet':
+            ranges = query.get('ranges', [])
+            by_column = query.get('majorDimension', ['ROWS'])[0] == 'COLUMNS'
+            return 'values.batchGet', {
+                'spreadsheetId': spreadsheet_id,
+                'valueRanges': [self._get_values(spreadsheet, a1, by_column) for a1 in ranges],
+            }
+        if parts[2] == 'values:batchUpdate':
+            updated = sum(self._update_values(spreadsheet, item['range'], item['values']) for item in body.get('data', []))
+            return 'values.batchUpdate', {'spreadsheetId': spreadsheet_id, 'totalUpdatedCells': updated}
+        # The range segment is percent-encoded, so a literal ':' can only start the ':clear' action
+        if parts[3].endswith(':clear'):
+            a1 = unquote(parts[3][:-len(':clear')])
+            sheet, r0, c0, r1, c1 = parse_range(a1)
+            spreadsheet.tab(sheet).clear(r0, c0, r1, c1)
+            return 'values.clear', {'spreadsheetId': spreadsheet_id, 'clearedRange': a1}
+        a1 = unquote(parts[3])
+        if method == 'PUT':
+            updated = self._update_values(spreadsheet, a1, body.get('values', []))
+            return 'values.update', {'spreadsheetId': spreadsheet_id, 'updatedRange': a1, 'updatedCells': updated}
+        return 'values.get', self._get_values(spreadsheet, a1, False)
+
+    def _get_values(self, spreadsheet, a1, by_column):
+        sheet, r0, c0, r1, c1 = parse_range(a1)
+        values = spreadsheet.tab(sheet).read(r0, c0, r1, c1)
+        if by_column and values:
+            width = max(len(row) for row in values)
+            padded = [row + [''] * (width - len(row)) for row in values]
+            values = [list(column) for column in zip(*padded)]
+            for column in values:
+                while column and column[-1] == '':
+                    column.pop()
+        result = {'range': a1, 'majorDimension': 'COLUMNS' if by_column else 'ROWS'}
+        if values:
+            result['values'] = values
+        return result
+
+    def _update_values(self, spreadsheet, a1, values):
+        sheet, r0, c0, _, _ = parse_range(a1)
+        return spreadsheet.tab(sheet).write(r0, c0, values)
+
+    def _batch_update(self, spreadsheet, body):
+        replies = []
+        for request in body.get('requests', []):
+            if 'addSheet' in request:
+                tab = spreadsheet.add_tab(request['addSheet']['properties']['title'])
+                replies.append({'addSheet': {'properties': tab.properties()}})
+            elif 'updateCells' in request:
+                grid = request['updateCells']['range']
+                end_row = grid.get('endRowIndex')
+                end_col = grid.get('endColumnIndex')
+                spreadsheet.tab_by_id(grid['sheetId']).clear(
+                    grid.get('startRowIndex', 0),
+                    grid.get('startColumnIndex', 0),
+                    None if end_row is None else end_row - 1,
+                    None if end_col is None else end_col - 1,
+                )
+                replies.append({})
+            elif 'deleteDimension' in request:
+                grid = request['deleteDimension']['range']
+                if grid.get('dimension') != 'ROWS':
+                    raise ApiError(400, 'INVALID_ARGUMENT', f"Unsupported dimension: {grid.get('dimension')}")
+                spreadsheet.tab_by_id(grid['sheetId']).delete_rows(grid['startIndex'], grid['endIndex'])
+                replies.append({})
+            else:
+                raise ApiError(400, 'INVALID_ARGUMENT', f"Unsupported request: {list(request)}")
+        return {'spreadsheetId': spreadsheet.spreadsheet_id, 'replies': replies}
+
+    def _should_fail(self):
+        with self.lock:
+            if self.forced_errors:
+                self.forced_errors -= 1
+                return True
+            return self.error_rate and self.random.random() < self.error_rate
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def handle_api(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                raw = self.rfile.read(length) if length else b''
+                if server.latency:
+                    time.sleep(server.latency)
+                url = urlparse(self.path)
+                try:
+                    if server._should_fail():
+                        raise ApiError(429, 'RESOURCE_EXHAUSTED', 'Quota exceeded.')
+                    body = json.loads(raw) if raw else {}
+                    with server.lock:
+                        operation, payload = server.dispatch(self.command, url.path, parse_qs(url.query), body)
+                    status = 200
+                except ApiError as e:
+                    operation, status = 'error', e.code
+                    payload = {'error': {'code': e.code, 'message': str(e), 'status': e.status}}
+                data = json.dumps(payload).encode('utf-8')
+                with server.lock:
+                    server.stats['calls'][operation] += 1
+                    server.stats['bytes_in'] += len(raw)
+                    server.stats['bytes_out'] += len(data)
+                    if status != 200:
+                        server.stats['errors'] += 1
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=UTF-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = handle_api
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
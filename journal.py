@@ -0,0 +1,103 @@
+import glob
+import json
+import os
+from datetime import datetime
+
+from planner import Partition
+
+
+def journal_path_for(output_path):
+    return os.path.splitext(output_path)[0] + '.journal.jsonl'
+
+
+def latest_journal(folder='output'):
+    journals = glob.glob(os.path.join(folder, '*.journal.jsonl'))
+    return max(journals, key=os.path.getmtime) if journals else None
+
+
+def partition_to_json(partition):
+    return [list(partition.states), partition.min_dsr, partition.max_dsr, partition.min_renters, partition.max_renters]
+
+
+def partition_from_json(value):
+    states, min_dsr, max_dsr, min_renters, max_renters = value
+    return Partition(tuple(states), min_dsr, max_dsr, min_renters, max_renters)
+
+
+class Journal:
+    """
+    Append-only JSONL record of a sweep. Every line is flushed and fsynced before
+    append() returns, so after a crash the journal is only ever missing the
+    partitions that were still in flight.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def append(self, record):
+        self.file.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def start_run(self, output_path, root):
+        self.append({
+            'type': 'run',
+            'output': output_path,
+            'root': partition_to_json(root),
+            'started': datetime.now().isoformat(timespec='seconds'),
+        })
+
+    def record_partition(self, partition, status, count, offset, duplicates=0):
+        """
+        status is 'leaf', 'truncated' or 'split'; count is the number of rows written,
+        duplicates the rows dropped as already seen, and offset the output file size
+        once the partition's rows are durably written.
+        """
+        self.append({
+            'type': 'partition',
+            'partition': partition_to_json(partition),
+            'status': status,
+            'count': count,
+            'duplicates': duplicates,
+            'offset': offset,
+        })
+
+    def close(self):
+        self.file.close()
+
+
+class ResumeState:
+    def __init__(self):
+        self.output = None
+        self.root = None
+        self.completed = {}
+        self.offset = 0
+        self.count = 0
+        self.journal_size = 0  # bytes of complete lines; anything after is a torn write
+
+
+def load_journal(path):
+    """
+    Read a journal back into a ResumeState. A torn last line from a crash mid-write is
+    ignored; truncate the journal to state.journal_size before appending to it again.
+    """
+    state = ResumeState()
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            state.journal_size += len(line)
+            if record['type'] == 'run':
+                state.output = record['output']
+                state.root = partition_from_json(record['root'])
+            elif record['type'] == 'partition':
+                state.completed[partition_from_json(record['partition'])] = record['status']
+                state.offset = record['offset']
+                if record['status'] != 'split':
+                    state.count += record['count']
+    return state
@@ -0,0 +1,136 @@
+"""
+Logging shared by main.py, chart.py and sheet.py.
+
+Callers only put records on a queue; a background listener thread writes them as
+JSON lines to one rotating file and, optionally, to the console. Structured fields
+go in `extra={'fields': {...}}` (or log_event) and become keys of the JSON event.
+Before setup_logging() is called, records are printed to the console directly.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+from datetime import datetime, timezone
+
+from rich.console import Console
+
+LOGGER_NAME = 'dsrdata'
+LOG_PATH = os.path.join('logs', 'events.jsonl')
+# print_info message types -> logging levels
+LEVELS = {'DBG': logging.DEBUG, 'INF': logging.INFO, 'SUC': logging.INFO, 'WRN': logging.WARNING, 'ERR': logging.ERROR}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per record: ts, level, logger, msg plus the record's fields.
+    """
+
+    def format(self, record):
+        event = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        event.update(getattr(record, 'fields', None) or {})
+        return json.dumps(event, default=str)
+
+
+class ConsoleHandler(logging.Handler):
+    """
+    Colored console lines, rendered on the listener thread rather than by the caller.
+    A record's `renderable` (a rich Table, say) is printed below its message.
+    """
+    STYLES = {'DEBUG': 'dim', 'INFO': 'green', 'WARNING': 'yellow', 'ERROR': 'red', 'CRITICAL': 'bold red'}
+    TAGS = {'DEBUG': 'DBG', 'INFO': 'INF', 'WARNING': 'WRN', 'ERROR': 'ERR', 'CRITICAL': 'CRT'}
+
+    def __init__(self, level=logging.INFO):
+        super().__init__(level)
+        self.console = Console(highlight=False, soft_wrap=True)
+
+    def emit(self, record):
+        try:
+            when = datetime.fromtimestamp(record.created).strftime("%Y-%m-%d %H:%M:%S")
+            self.console.print(f"{when} [{self.TAGS.get(record.levelname, record.levelname)}] {record.getMessage()}",
+                               style=self.STYLES.get(record.levelname), markup=False)
+            renderable = getattr(record, 'renderable', None)
+            if renderable is not None:
+                self.console.print(renderable)
+        except Exception:
+            self.handleError(record)
+
+
+def level_for(mtype):
+    """
+    'INF', 'WRN', 'ERR', 'SUC' (or 'error', 'warning', ...) -> logging level.
+    """
+    return LEVELS.get(str(mtype)[:3].upper(), logging.INFO)
+
+
+def get_logger(name=None):
+    """
+    A dsrdata logger. Until setup_logging() runs, INFO and above go straight to the
+    console, so modules such as sheet.py used as a library still show their messages.
+    """
+    root = logging.getLogger(LOGGER_NAME)
+    if not root.handlers:
+        root.addHandler(ConsoleHandler(logging.INFO))
+        root.setLevel(logging.INFO)
+        root.propagate = False
+    return logging.getLogger(f"{LOGGER_NAME}.{name}" if name else LOGGER_NAME)
+
+
+def log_event(logger, level, msg, **fields):
+    if logger.isEnabledFor(level):
+        logger.log(level, msg, extra={'fields': fields})
+
+
+def setup_logging(path=LOG_PATH, level=logging.DEBUG, console=True, console_level=logging.INFO,
+                  max_bytes=10 * 1024 * 1024, backups=5):
+    """
+    Route every dsrdata logger through a queue to a rotating JSONL file (records at
+    `level` and above) and, with console=True, to the terminal (console_level and
+    above). Calling it again replaces the previous setup.
+    """
+    global _listener
+    shutdown_logging()
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+    file_handler.setLevel(level)
+    file_handler.setFormatter(JsonFormatter())
+    handlers = [file_handler]
+    if console:
+        handlers.append(ConsoleHandler(console_level))
+
+    records = queue.SimpleQueue()
+    logger = get_logger()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(logging.handlers.QueueHandler(records))
+    logger.setLevel(min(level, console_level) if console else level)
+    logger.propagate = False
+    _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    _listener.start()
+    return logger
+
+
+def shutdown_logging():
+    """
+    Drain the queue and close the handlers. Registered to run at exit.
+    """
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
+
+atexit.register(shutdown_logging)
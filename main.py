@@ -1,14 +1,26 @@
-from rich import print
-import requests
+from contextlib import nullcontext
 from datetime import datetime
-import json 
 import os
 import pandas as pd
-import time
-import random
-from bs4 import BeautifulSoup
+import argparse
+import logging
+import requests
 from sheet import SheetManager
+from planner import ALL_STATES, RESULT_CAP, Partition, is_capped, sweep
+from ratelimit import TokenBucket
+from session import AuthError, SessionManager
+from cache import CacheMiss, ResponseCache
+from journal import Journal, journal_path_for, latest_journal, load_journal
+from sinks import MARKET_COLUMNS, CsvSink
+from snapshots import SnapshotStore, run_id_for
+from diff import diff_markets
+from dedup import KEY_COLUMNS, MarketDeduper
+from markets import parse_markets
+from logger import LOG_PATH, get_logger, level_for, log_event, setup_logging
+from metrics import METRICS, profiled
 
+# Overridable so a sweep can run against a local stand-in such as fake_dsrdata.py
+BASE_URL = os.environ.get('DSRDATA_BASE_URL', 'https://dsrdata.com.au').rstrip('/')
 HEADERS = {
     'Host': 'dsrdata.com.au',
     'User-Agent': 'Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:141.0) Gecko/20100101 Firefox/141.0',
@@ -24,44 +36,32 @@ HEADERS = {
     'Priority': 'u=0',
     'Connection': 'keep-alive',
 }
-COOKIES = dict()
+SESSION = None
 COUNT = 0
-ACCESS_TOKEN = None
 SHEET_MANAGER = None
+RESPONSE_CACHE = None
+MIN_DSR, MAX_DSR = 30, 76  # DSR range covered by a sweep
+# Shared request budget, about one request per 4 seconds like the old per-call sleeps
+LIMITER = TokenBucket(rate=0.25, burst=1, jitter=1.0)
+LOG = get_logger('main')
+METRICS_PATH = os.path.join('logs', 'main_metrics.json')
+PROFILE_PATH = os.path.join('logs', 'main.prof')
     
 def make_post_requests(url, data):
-    global COOKIES
-    response = requests.post(url, json=data, headers=HEADERS, cookies=COOKIES)
-    print_info(f'Url: {url}, Status: {response.status_code}', mtype="INF")
-    return response
-
-def make_get_requests(url):
-    global COOKIES
-    response = requests.get(url, headers=HEADERS, cookies=COOKIES)
-    print_info(f'Url: {url}, Status: {response.status_code}', mtype="INF")
+    # SESSION paces the request through LIMITER and adds the access token
+    response = SESSION.post(url, json=data)
+    print_info(f'Url: {url}, Status: {response.status_code}', mtype="DBG", url=url, status=response.status_code,
+               latency_ms=round(response.elapsed.total_seconds() * 1000, 1), bytes=len(response.content))
     return response
 
-def time_now():
-    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-def print_info(msg, mtype='INF'):
-    if mtype == 'INF':
-        print(f"[green]{time_now()} [INF][/green] {msg}")
-    elif mtype == 'ERR':
-        log_error(msg)
-        print(f"[red]{time_now()} [ERR][/red] {msg}")
-    elif mtype == 'WRN':
-        print(f"[yellow]{time_now()} [WRN][/yellow] {msg}")
-    else:
-        print(f"[{mtype}] {msg}")
-
-def log_error(msg):
-    with open("error.log", "a") as f:
-        f.write(f"{time_now()} [ERR] {msg}\n")
+def print_info(msg, mtype='INF', **fields):
+    """
+    Queue a log record; keyword arguments become fields of its JSONL event.
+    """
+    log_event(LOG, level_for(mtype), msg, **fields)
 
-def get_data(min_dsr, max_dsr,min_renters = 0, max_renters=100 ,state=None, save_info=False):
+def get_data(min_dsr, max_dsr,min_renters = 0, max_renters=100 ,state=None):
     global COUNT
-    global ACCESS_TOKEN
     if not state:
         state_value = 'ACT,NSW,NT,QLD,SA,TAS,VIC,WA'
     else:
@@ -150,125 +150,53 @@ def get_data(min_dsr, max_dsr,min_renters = 0, max_renters=100 ,state=None, save
             },
         }
     
-    url = f'https://dsrdata.com.au/DSRWeb/secure/getMatchingMkts.json?access_token={ACCESS_TOKEN}'
-    response = make_post_requests(url, data=json_data)  
-    jsonResults = json.loads(response.text)
-    res = jsonResults['response']
-    warnings = res.get('warnings')
+    url = f'{BASE_URL}/DSRWeb/secure/getMatchingMkts.json'
+    criteria = dict(state=state_value, min_dsr=min_dsr, max_dsr=max_dsr, min_renters=min_renters, max_renters=max_renters)
+    text = RESPONSE_CACHE.get_response(json_data) if RESPONSE_CACHE else None
+    if RESPONSE_CACHE:
+        METRICS.inc('cache_lookups_total', cache='responses', result='miss' if text is None else 'hit')
+    if text is None:
+        response = make_post_requests(url, data=json_data)
+        # Parse the raw bytes, response.text would guess the charset first
+        with METRICS.timer('parse'):
+            try:
+                markets, warnings = parse_markets(response.content)
+            except (ValueError, KeyError) as e:
+                # An HTML error page or a body without 'response', usually after a 5xx
+                raise ValueError(f"Unreadable getMatchingMkts response (HTTP {response.status_code}): {e!r}") from e
+        if RESPONSE_CACHE and response.status_code == 200:
+            RESPONSE_CACHE.put_response(json_data, response.content)
+    else:
+        print_info(f"Cache hit for DSR {min_dsr}-{max_dsr}, state: {state}, renters: {min_renters}-{max_renters}", mtype="DBG",
+                   source='cache', **criteria)
+        with METRICS.timer('parse'):
+            markets, warnings = parse_markets(text)
+    METRICS.observe('partition_results', len(markets))
     if warnings:
         warning = warnings.get("WRN")
-        print_info(f"Warnings: {warning}", mtype="WRN")
-        if save_info:
-            print_info(f"Saving warning to info.txt", mtype="INF")
-            with open('info.txt', 'a') as f:
-                f.write(f"{time_now()} Warning: {warning}\n")
-                f.write(f"{time_now()} Min DSR: {min_dsr}, Max DSR: {max_dsr}, state: {state}, min_renters: {min_renters}, max_renters: {max_renters}\n")
-                f.write('')
-    mkts = res.get('mkt')
-    # check if mkts is list or dictionary
-    if isinstance(mkts, dict):
-        mkts = [mkts]
-    infos = []
-    if not mkts:
-        print_info('No markets found', mtype='error')
+        print_info(f"Warnings: {warning}", mtype="WRN", warning=warning, **criteria)
+    if not len(markets):
+        print_info('No markets found', mtype='INF', count=0, **criteria)
         more = False
-        return infos, more
-    print_info(f"Markets found: {len(mkts)}. Total data: {COUNT}", mtype="INF")
+        return markets, more
+    print_info(f"Markets found: {len(markets)}. Total data: {COUNT}", mtype="INF", count=len(markets), **criteria)
     
-    # Log if we hit the 250 limit
-    if len(mkts) >= 250:
-        log_message = f"{time_now()} - Hit 250+ results limit: Min DSR: {min_dsr}, Max DSR: {max_dsr}, State: {state}, Min Renters: {min_renters}, Max Renters: {max_renters}, Results: {len(mkts)}\n"
-        print_info(f"Hit 250+ results limit - logging to logs.txt", mtype="WRN")
-        with open('logs.txt', 'a') as f:
-            f.write(log_message)
-    
-    for mkt in mkts:
-        mkt_stats = mkt['mkt_stats']
-        info = {
-            'State': mkt['st'],
-            'Post Code': mkt['pc'],
-            'Property Type': mkt['pt'],
-            'Suburb': mkt['lo'],
-            'Auction clearance rate': mkt_stats.get('ACR'),
-            'Avg vendor discount': mkt_stats.get('DISCOUNT'),
-            'Days on market': mkt_stats.get('DOM'),
-            'Demand to Supply Ratio': mkt_stats.get('DSR'),
-            'Median 12 months': mkt_stats.get('MEDIAN_12'),
-            'Online search interest': mkt_stats.get('OSI'),
-            'Percent renters in market': mkt_stats.get('RENTERS'),
-            'Percent stock on market': mkt_stats.get('SOM_PERC'),
-            'Statistical reliability': mkt_stats.get('SR'),
-            'Typical value': mkt_stats.get('TV'),
-            'Vacancy rate': mkt_stats.get('VACANCY'),
-            'Gross rental yield': mkt_stats.get('YIELD'),
-        }
-        lookup_info = {
-            'Suburb': mkt['lo'],
-            'State': mkt['st'],
-            'Post Code': mkt['pc'],
-            'Property Type': mkt['pt']
-        }
-        infos.append(info)
-        more = True
-    sleep_time = random.uniform(2, 5)
-    print_info(f"Sleeping for {sleep_time:.2f} seconds to avoid hitting the server too hard", mtype="INF")
-    time.sleep(sleep_time)  # Sleep to avoid hitting the server too hard
-    return infos, more
-
-def load_cookies_from_json(json_path="cookies.json"):
-    """
-    Load cookies from a JSON file (Chrome/Firefox export format) and return as a dict for requests.
-    Checks if the file exists and prints info or error.
-    """
-    if not os.path.exists(json_path):
-        print_info(f"Cookie file '{json_path}' does not exist.", mtype="ERR")
-        return {}
-    try:
-        with open(json_path, "r") as f:
-            cookies_list = json.load(f)
-        cookies_dict = {cookie["name"]: cookie["value"] for cookie in cookies_list}
-        print_info(f"Loaded cookies from '{json_path}'.", mtype="INF")
-        return cookies_dict
-    except Exception as e:
-        print_info(f"Failed to load cookies: {e}", mtype="ERR")
-        return {}
-
-# save list of dictionary data into csv file and check if file exists. If yes append data to it
-def save_to_csv(data, filename='markets.csv'):
-    new_df = pd.DataFrame(data)
-    if os.path.exists(filename):
-        df = pd.read_csv(filename)
-        # Drop all-NA columns to avoid FutureWarning
-        df = df.dropna(axis=1, how='all')
-        new_df = new_df.dropna(axis=1, how='all')
-        if not df.empty and not new_df.empty:
-            df = pd.concat([df, new_df], ignore_index=True)
-        elif df.empty:
-            df = new_df
-        # If new_df is empty, no need to concatenate
-    else:
-        df = new_df
-
-    # Save the DataFrame to the CSV file only if it's not empty
-    if not df.empty:
-        df.to_csv(filename, index=False)
+    if len(markets) >= RESULT_CAP:
+        METRICS.inc('cap_hits_total')
+        print_info(f"Hit {RESULT_CAP}+ results limit: Min DSR: {min_dsr}, Max DSR: {max_dsr}, State: {state}, "
+                   f"Min Renters: {min_renters}, Max Renters: {max_renters}, Results: {len(markets)}",
+                   mtype="WRN", event='cap_hit', count=len(markets), **criteria)
+    more = True
+    return markets, more
 
 def is_logged_in():
-    global ACCESS_TOKEN
-    url = 'https://dsrdata.com.au/'
-    response = make_get_requests(url)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    email = soup.find('div', class_='email')
-    access_token = soup.find(id='accesstoken')
-    if access_token:
-        ACCESS_TOKEN = access_token.get('value')
-    if email and access_token:
-        print_info(f"User is logged in as: {email.text.strip()}", mtype="INF")
-        print_info(f"Access token: {ACCESS_TOKEN}", mtype="INF")
-        return True
-    else:
-        print_info("User is not logged in.", mtype="WRN")
+    try:
+        email = SESSION.validate()
+    except AuthError as e:
+        print_info(f"User is not logged in: {e}", mtype="WRN")
         return False
+    print_info(f"User is logged in as: {email}", mtype="INF")
+    return True
 
 def create_filename():
     now = datetime.now()
@@ -277,44 +205,131 @@ def create_filename():
     filename = f"markets_{date_str}_{time_str}.csv"
     return filename
 
-# check every row in markets.csv and remove duplicates and show log about initial and final count
-def remove_duplicates(filename='markets.csv'):
+def load_markets(filename):
     if not os.path.exists(filename):
-        print_info(f"File {filename} does not exist. No duplicates to remove.", mtype="WRN")
+        print_info(f"File {filename} does not exist.", mtype="WRN")
+        return pd.DataFrame(columns=MARKET_COLUMNS)
+    return pd.read_csv(filename, dtype={'Post Code': str})
+
+# push the finished (already de-duplicated) markets table and its lookup table to Google Sheets
+def sync_to_sheets(df):
+    if not SHEET_MANAGER:
         return
-    df = pd.read_csv(filename)
     if df.empty:
-        print_info(f"File {filename} is empty. No duplicates to remove.", mtype="WRN")
+        print_info("No markets to sync.", mtype="WRN")
         return
 
-    initial_count = df.shape[0]
-    # Remove duplicates based on all columns
-    df.drop_duplicates(inplace=True)
-    final_count = df.shape[0]
-    
-    # Create new filename properly by splitting directory and filename
-    directory = os.path.dirname(filename)
-    basename = os.path.basename(filename)
-    new_filename = os.path.join(directory, f'new_{basename}')
-    
-    # Save the DataFrame back to the CSV file
-    df.to_csv(new_filename, index=False)
+    df_lookup_data = df.loc[:, ['Suburb', 'State', 'Post Code', 'Property Type']]
+    # The lookup tab only holds keys, so rows already in the sheet can be skipped outright
+    existing = SHEET_MANAGER.get_existing_data('lookup_data', key_columns=KEY_COLUMNS)
+    lookup_keys = df_lookup_data.loc[:, list(KEY_COLUMNS)].astype(str).apply(tuple, axis=1)
+    new_lookup_data = df_lookup_data[~lookup_keys.isin(existing)]
+    print_info(f"{len(df_lookup_data) - len(new_lookup_data)} lookup rows already in the sheet, {len(new_lookup_data)} new", mtype="INF")
+    with SHEET_MANAGER.batch_writes():
+        SHEET_MANAGER.upsert_to_sheet(df, 'dsr_data', key_columns=KEY_COLUMNS, prune=True)
+        if not new_lookup_data.empty:
+            SHEET_MANAGER.append_dataframe(new_lookup_data, 'lookup_data')
 
-    df_lookup_data = df.loc[:, ['Suburb', 'State', 'Post Code', 'Property Type']].drop_duplicates()
-    if SHEET_MANAGER:
-        dsr_records = df.fillna('').to_dict(orient='records')
-        lookup_records = df_lookup_data.fillna('').to_dict(orient='records')
-        SHEET_MANAGER.log_to_sheet(dsr_records, 'dsr_data')
-        SHEET_MANAGER.log_to_sheet(lookup_records, 'lookup_data')
 
-    print_info(f"Removed duplicates from {filename}. Initial count: {initial_count}, Final count: {final_count}", mtype="INF")
-    print_info(f"Clean data saved to {new_filename}", mtype="INF")
+def run_sweep(filename, journal_path, root, completed=None, deduper=None, workers=1, append=False):
+    """
+    Sweep `root` into the CSV `filename`, journaling every finished partition so the run
+    can be resumed. Returns the SweepReport; CacheMiss and KeyboardInterrupt propagate.
+    """
+    deduper = deduper or MarketDeduper()
+    journal = Journal(journal_path)
+    if not append:
+        journal.start_run(filename, root)
+    sink = CsvSink(filename, append=append)
 
+    def fetch(partition):
+        print_info(f"Searching for markets with {partition}", mtype="DBG", **partition._asdict())
+        data, _ = get_data(partition.min_dsr, partition.max_dsr, state=partition.state_value,
+                           min_renters=partition.min_renters, max_renters=partition.max_renters)
+        if is_capped(data) and partition.split():
+            print_info(f"Hit {RESULT_CAP}+ results limit for {partition}. Splitting.", mtype="WRN",
+                       event='split', **partition._asdict())
+        return data
 
-def main():
+    def save_leaf(partition, data):
+        global COUNT
+        with METRICS.timer('dedup'):
+            unique, duplicates = deduper.filter(data)
+        METRICS.inc('duplicates_total', duplicates)
+        if duplicates:
+            print_info(f"Dropped {duplicates} duplicate markets already fetched by an overlapping partition: {partition}", mtype="WRN")
+        if unique:
+            COUNT += len(unique)
+            with METRICS.timer('csv_write'):
+                sink.write_rows(unique)
+            METRICS.inc('rows_written_total', len(unique), sink='csv')
+            print_info(f"Saved {len(unique)} records for {partition}. Total: {COUNT}", mtype="INF")
+        elif not data:
+            print_info(f"No data found for {partition}", mtype="WRN")
+        status = 'truncated' if is_capped(data) else 'leaf'
+        print_info(f"Finished {partition}: {status}", mtype="DBG", event='partition', status=status, count=len(data),
+                   saved=len(unique), duplicates=duplicates, **partition._asdict())
+        METRICS.inc('partitions_total', status=status)
+        with METRICS.timer('fsync'):
+            offset = sink.flush()
+        journal.record_partition(partition, status, len(unique), offset, duplicates=duplicates)
+
+    def record_split(partition, data):
+        METRICS.inc('partitions_total', status='split')
+        with METRICS.timer('fsync'):
+            offset = sink.flush()
+        journal.record_partition(partition, 'split', len(data), offset)
+
+    try:
+        with METRICS.timer('sweep'):
+            return sweep(fetch, [root], on_leaf=save_leaf, workers=workers,
+                         on_split=record_split, completed=completed)
+    finally:
+        sink.close()
+        journal.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Sweep dsrdata.com.au market data into CSV and Google Sheets.")
+    parser.add_argument("--rate", type=float, default=0.25, help="Requests per second across all workers. Default: 0.25")
+    parser.add_argument("--burst", type=int, default=1, help="Requests allowed back to back before rate limiting. Default: 1")
+    parser.add_argument("--jitter", type=float, default=1.0, help="Random extra delay per request in seconds. Default: 1.0")
+    parser.add_argument("--workers", type=int, default=4, help="Maximum requests in flight. Default: 4")
+    parser.add_argument("--cache-dir", type=str, default=os.path.join(".cache", "responses"), help="Response cache folder. Default: .cache/responses")
+    parser.add_argument("--cache-ttl", type=float, default=1,
+                        help="Hours before a cached response expires; keep it well below the run interval. Ignored with --offline. Default: 1")
+    parser.add_argument("--cache-max-mb", type=float, default=512, help="Cache size limit in MB, least recently used entries are evicted first. Default: 512")
+    parser.add_argument("--no-cache", action="store_true", help="Always query the server and do not store responses")
+    parser.add_argument("--offline", action="store_true", help="Serve every query from the cache and fail on a miss")
+    parser.add_argument("--resume", nargs="?", const="latest", default=None,
+                        help="Resume an interrupted sweep from its journal. Default: the newest journal in output/")
+    parser.add_argument("--log-file", type=str, default=LOG_PATH, help=f"Rotating JSONL event log. Default: {LOG_PATH}")
+    parser.add_argument("--log-level", type=str.upper, default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="Lowest level shown on the console; the event log always records DEBUG. Default: INFO")
+    parser.add_argument("--quiet", action="store_true", help="Only write the event log, nothing to the console")
+    parser.add_argument("--metrics-file", type=str, default=METRICS_PATH,
+                        help=f"Run metrics written at exit, a Prometheus textfile if it ends in .prom. Default: {METRICS_PATH}")
+    parser.add_argument("--profile", nargs="?", const=PROFILE_PATH, default=None,
+                        help=f"Run under cProfile and dump the stats. Default path: {PROFILE_PATH}")
+    parser.add_argument("--snapshot-dir", type=str, default="snapshots", help="Parquet snapshot dataset folder. Default: snapshots")
+    return parser.parse_args()
+
+def run(args):
     global COUNT
-    global COOKIES
     global SHEET_MANAGER
+    global LIMITER
+    global SESSION
+    global RESPONSE_CACHE
+
+    LIMITER = TokenBucket(rate=args.rate, burst=args.burst, jitter=args.jitter)
+    if args.offline and args.no_cache:
+        print_info("--offline needs the response cache, drop --no-cache.", mtype="ERR")
+        return
+    if not args.no_cache:
+        # Offline runs replay whatever is cached, however old; live runs only reuse recent responses
+        ttl = None if args.offline else args.cache_ttl * 3600
+        RESPONSE_CACHE = ResponseCache(args.cache_dir, ttl=ttl,
+                                       max_bytes=int(args.cache_max_mb * 1024 * 1024), offline=args.offline)
 
     save_to_sheet = input("Do you want to log data to Google Sheets? (y/n): ").strip().lower() == 'y'
     if save_to_sheet:
@@ -324,117 +339,100 @@ def main():
         SHEET_MANAGER = None
         print_info("Google Sheets logging is disabled.", mtype="INF")
 
-    COOKIES = load_cookies_from_json()
+    if args.offline:
+        print_info("Offline mode: serving every query from the response cache.", mtype="INF")
+    else:
+        SESSION = SessionManager(BASE_URL, HEADERS, pool_size=args.workers, limiter=LIMITER)
 
-    logged_in = is_logged_in()
+        logged_in = is_logged_in()
 
-    if not logged_in:
-        print_info("User is not logged in. Please update cookies..", mtype='error')
+        if not logged_in:
+            print_info("User is not logged in. Please update cookies..", mtype='error')
+            return
+
+    root = Partition(ALL_STATES, MIN_DSR, MAX_DSR, 0, 100)
+    completed = {}
+    deduper = MarketDeduper()
+    if args.resume:
+        journal_path = latest_journal() if args.resume == 'latest' else args.resume
+        if not journal_path or not os.path.exists(journal_path):
+            print_info(f"No journal found to resume from: {journal_path}", mtype="ERR")
+            return
+        resume_state = load_journal(journal_path)
+        filename, root, completed = resume_state.output, resume_state.root, resume_state.completed
+        # Drop rows written after the last journaled partition, they will be fetched again
+        if os.path.exists(filename):
+            with open(filename, 'rb+') as f:
+                f.truncate(resume_state.offset)
+        # Cut a torn last journal line so the resumed run's records start on a line of their own
+        with open(journal_path, 'rb+') as f:
+            f.truncate(resume_state.journal_size)
+        COUNT = resume_state.count
+        if resume_state.offset:
+            existing = pd.read_csv(filename, usecols=list(KEY_COLUMNS), dtype=str, keep_default_na=False)
+            deduper.add_keys(existing.itertuples(index=False, name=None))
+        print_info(f"Resuming {filename} from {journal_path}: {len(completed)} partitions done, {COUNT} records", mtype="INF")
+    else:
+        filename = create_filename()
+        if not os.path.exists('output'):
+            os.makedirs('output')
+        filename = os.path.join('output', filename)
+        journal_path = journal_path_for(filename)
+    try:
+        report = run_sweep(filename, journal_path, root, completed=completed, deduper=deduper,
+                           workers=args.workers, append=bool(args.resume))
+    except CacheMiss as e:
+        print_info(f"{e}. Run without --offline to fetch it.", mtype="ERR")
+        return
+    except AuthError as e:
+        print_info(f"{e}. Update cookies.json and resume with: python3 main.py --resume {journal_path}", mtype="ERR")
+        return
+    except (requests.RequestException, ValueError, KeyError) as e:
+        # Network errors left once retries are exhausted and unreadable responses
+        print_info(f"Sweep stopped: {e}. Resume with: python3 main.py --resume {journal_path}", mtype="ERR",
+                   event='sweep_failed', error=type(e).__name__)
+        return
+    except KeyboardInterrupt:
+        print_info(f"Interrupted. Resume with: python3 main.py --resume {journal_path}", mtype="WRN")
         return
+    print_info(f"Sweep finished: {report}", mtype="INF")
+    for partition in report.truncated:
+        print_info(f"Truncated leaf that cannot be split further, results may be missing: {partition}", mtype="WRN",
+                   event='truncated', **partition._asdict())
 
-    stat_values = ['QLD', 'NSW', 'VIC', 'WA', 'SA', 'TAS', 'NT', 'ACT']  # All states
-    filename = create_filename()
-    if not os.path.exists('output'):
-        os.makedirs('output')
-    filename = os.path.join('output', filename)
-    
-    min_dsr, max_dsr = 30, 40  # Start from beginning
-    all_state_data = []
-    
-    while True:
-        print_info(f"Searching for markets with DSR between {min_dsr} and {max_dsr}", mtype="INF")
-        data, _ = get_data(min_dsr, max_dsr)
-        
-        if len(data) >= 250:
-            # Need to break down by states
-            all_state_data = []
-            for state in stat_values:
-                print_info(f"Searching for markets with DSR between {min_dsr} and {max_dsr} in {state}", mtype="INF")
-                state_data, _ = get_data(min_dsr, max_dsr, state=state)
-                
-                if len(state_data) >= 250:
-                    print_info(f"Hit 250+ results limit for DSR {min_dsr}-{max_dsr} in {state}. Segmenting by renter ranges.", mtype="WRN")
-                    for i in range(4):
-                        min_renters = i * 25
-                        max_renters = min_renters + 25
-                        print_info(f"Searching for markets with DSR {min_dsr}-{max_dsr} in {state} with renters between {min_renters} and {max_renters}", mtype="INF")
-                        segmented_data, _ = get_data(min_dsr, max_dsr, state=state, min_renters=min_renters, max_renters=max_renters)
-                        # if semented length is greater than 250, try two times set min_dsr and max_dsr
-                        if len(segmented_data) >= 250:
-                            print_info(f"Segmented data for DSR {min_dsr}-{max_dsr} in {state} with renters {min_renters}-{max_renters} still has 250+ results. Breaking down by individual DSR values.", mtype="WRN")
-                            
-                            # Get data for min_dsr
-                            segmented_data1, _ = get_data(min_dsr, min_dsr, state=state, min_renters=min_renters, max_renters=max_renters)
-                            if len(segmented_data1) >= 250:
-                                print_info(f"DSR {min_dsr} data still has 250+ results. Breaking down renter range {min_renters}-{max_renters} into smaller segments.", mtype="WRN")
-                                
-                                # Calculate range size and split into 5 equal parts
-                                range_size = max_renters - min_renters
-                                segment_size = range_size // 5
-                                
-                                for j in range(5):
-                                    segment_min = min_renters + (j * segment_size)
-                                    segment_max = segment_min + segment_size if j < 4 else max_renters  # Last segment goes to max_renters
-                                    
-                                    print_info(f"Searching DSR {min_dsr} in {state} with renters {segment_min}-{segment_max}", mtype="INF")
-                                    micro_segment_data, _ = get_data(min_dsr, min_dsr, state=state, min_renters=segment_min, max_renters=segment_max)
-                                    all_state_data.extend(micro_segment_data)
-                            else:
-                                print_info(f"Found {len(segmented_data1)} markets for DSR {min_dsr} in {state} with renters {min_renters}-{max_renters}. Adding to all_state_data.", mtype="INF")
-                                all_state_data.extend(segmented_data1)
-                            
-                            # Get data for max_dsr
-                            segmented_data2, _ = get_data(max_dsr, max_dsr, state=state, min_renters=min_renters, max_renters=max_renters)
-                            if len(segmented_data2) >= 250:
-                                print_info(f"DSR {max_dsr} data still has 250+ results. Breaking down renter range {min_renters}-{max_renters} into smaller segments.", mtype="WRN")
-                                
-                                # Calculate range size and split into 5 equal parts
-                                range_size = max_renters - min_renters
-                                segment_size = range_size // 5
-                                
-                                for j in range(5):
-                                    segment_min = min_renters + (j * segment_size)
-                                    segment_max = segment_min + segment_size if j < 4 else max_renters  # Last segment goes to max_renters
-                                    
-                                    print_info(f"Searching DSR {max_dsr} in {state} with renters {segment_min}-{segment_max}", mtype="INF")
-                                    micro_segment_data, _ = get_data(max_dsr, max_dsr, state=state, min_renters=segment_min, max_renters=segment_max)
-                                    all_state_data.extend(micro_segment_data)
-                            else:
-                                print_info(f"Found {len(segmented_data2)} markets for DSR {max_dsr} in {state} with renters {min_renters}-{max_renters}. Adding to all_state_data.", mtype="INF")
-                                all_state_data.extend(segmented_data2)                               
-                            
-                        else:
-                            print_info(f"Found {len(segmented_data)} markets for DSR {min_dsr}-{max_dsr} in {state} with renters between {min_renters} and {max_renters}. Adding to all_state_data.", mtype="INF")
-                            all_state_data.extend(segmented_data)
-                else:
-                    print_info(f"Found {len(state_data)} markets for DSR {min_dsr}-{max_dsr} in {state}. Adding to all_state_data.", mtype="INF")
-                    all_state_data.extend(state_data)
-        else:
-            # Less than 250 results, use the original data
-            all_state_data = data
-            print_info(f"Found {len(data)} markets for DSR {min_dsr}-{max_dsr}. No segmentation needed.", mtype="INF")
-        
+    print_info(f"Dropped {deduper.duplicates} duplicate markets during the sweep. Unique markets: {len(deduper.seen)}", mtype="INF")
 
-        # Save data if we have any
-        if all_state_data:
-            COUNT += len(all_state_data)
-            save_to_csv(all_state_data, filename=filename)
-            print_info(f"Saved {len(all_state_data)} records for DSR {min_dsr}-{max_dsr}. Total: {COUNT}", mtype="INF")
-        else:
-            print_info(f"No data found for DSR {min_dsr}-{max_dsr}", mtype="WRN")
+    with METRICS.timer('load_csv'):
+        df = load_markets(filename)
+    if not df.empty:
+        store = SnapshotStore(args.snapshot_dir)
+        run_id = run_id_for(filename)
+        with METRICS.timer('snapshot'):
+            store.write(df, run_id)
+        print_info(f"Snapshot of {len(df)} markets written to {args.snapshot_dir}", mtype="INF")
 
+        previous_id = store.previous_run_id(run_id)
+        if previous_id:
+            with METRICS.timer('diff'):
+                changes = diff_markets(store.read(run_ids=[previous_id]), df)
+            changes_file = os.path.join(os.path.dirname(filename), f"changes_{run_id}.csv")
+            changes.to_frame().to_csv(changes_file, index=False)
+            print_info(f"Changes since run {previous_id}: {changes}. Saved to {changes_file}", mtype="INF")
 
-        # Move to next DSR range
-        min_dsr = max_dsr + 1
-        max_dsr = min_dsr + 1  # You can adjust the increment
-        
-        # Stop condition - you can modify this based on your needs
-        if min_dsr > 75:  # Example: stop at DSR 75
-            print_info("Reached maximum DSR limit", mtype="INF")
-            break
-    remove_duplicates(filename=filename)
+    with METRICS.timer('sheets_sync'):
+        sync_to_sheets(df)
     print_info(f"Data saved to {filename}", mtype="INF")
 
 
+def main():
+    args = parse_args()
+    setup_logging(args.log_file, console=not args.quiet, console_level=getattr(logging, args.log_level))
+    with profiled(args.profile, LOG) if args.profile else nullcontext():
+        try:
+            run(args)
+        finally:
+            METRICS.report(LOG, args.metrics_file)
+
+
 if __name__=="__main__":
     main()
\ No newline at end of file
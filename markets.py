@@ -0,0 +1,109 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+from sinks import MARKET_COLUMNS
+
+try:
+    import orjson
+
+    def loads(text):
+        return orjson.loads(text)
+except ImportError:
+    import json
+
+    def loads(text):
+        return json.loads(text)
+
+# getMatchingMkts field names behind each markets column
+IDENTITY_FIELDS = {'State': 'st', 'Post Code': 'pc', 'Property Type': 'pt', 'Suburb': 'lo'}
+STAT_FIELDS = {
+    'Auction clearance rate': 'ACR',
+    'Avg vendor discount': 'DISCOUNT',
+    'Days on market': 'DOM',
+    'Demand to Supply Ratio': 'DSR',
+    'Median 12 months': 'MEDIAN_12',
+    'Online search interest': 'OSI',
+    'Percent renters in market': 'RENTERS',
+    'Percent stock on market': 'SOM_PERC',
+    'Statistical reliability': 'SR',
+    'Typical value': 'TV',
+    'Vacancy rate': 'VACANCY',
+    'Gross rental yield': 'YIELD',
+}
+
+
+def _stat_array(values):
+    try:
+        return np.array(values, dtype='float64')  # None becomes NaN
+    except (TypeError, ValueError):
+        return pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy('float64')
+
+
+class MarketBatch:
+    """
+    Markets from one getMatchingMkts response, held as columns in MARKET_COLUMNS
+    order: lists of interned strings for the identity fields and float64 arrays
+    (NaN for missing) for the stats. No per-market dicts are built.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    @classmethod
+    def empty(cls):
+        return cls({column: [] if column in IDENTITY_FIELDS else np.empty(0) for column in MARKET_COLUMNS})
+
+    @classmethod
+    def from_response(cls, response):
+        """
+        Build a batch from the decoded 'response' object. A lone market comes back as
+        an object instead of a list.
+        """
+        mkts = response.get('mkt')
+        if not mkts:
+            return cls.empty()
+        if isinstance(mkts, dict):
+            mkts = [mkts]
+        intern = sys.intern
+        columns = {}
+        for column, field in IDENTITY_FIELDS.items():
+            columns[column] = [None if mkt.get(field) is None else intern(str(mkt[field])) for mkt in mkts]
+        stats = [mkt.get('mkt_stats') or {} for mkt in mkts]
+        for column, code in STAT_FIELDS.items():
+            columns[column] = _stat_array([stat.get(code) for stat in stats])
+        return cls(columns)
+
+    def __len__(self):
+        return len(self.columns['State'])
+
+    def key_rows(self, key_columns):
+        """
+        Iterate identity tuples in key_columns order.
+        """
+        return zip(*(self.columns[column] for column in key_columns))
+
+    def take(self, indices):
+        """
+        New batch holding only the rows at `indices`, in that order.
+        """
+        indices = np.asarray(indices, dtype=np.intp)
+        columns = {}
+        for column, values in self.columns.items():
+            if isinstance(values, np.ndarray):
+                columns[column] = values[indices]
+            else:
+                columns[column] = [values[i] for i in indices]
+        return MarketBatch(columns)
+
+    def to_frame(self, columns=MARKET_COLUMNS):
+        return pd.DataFrame({column: self.columns[column] for column in columns})
+
+
+def parse_markets(text):
+    """
+    Decode a getMatchingMkts body into (MarketBatch, warnings dict or None).
+    """
+    response = loads(text)['response']
+    return MarketBatch.from_response(response), response.get('warnings')
@@ -0,0 +1,287 @@
+"""
+Run metrics shared by main.py, chart.py and sheet.py.
+
+Code records into the module-level METRICS registry: counters (requests by status,
+cap hits, bytes, rows written, Sheets API calls, ...) and histograms (time spent per
+phase, results per partition). At the end of a run report() logs a summary table
+and writes every metric to a JSON file, or to a Prometheus textfile when the path
+ends in .prom. profiled() wraps a run in cProfile, worker threads included.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from rich.table import Table
+from rich.text import Text
+
+NAMESPACE = 'dsrdata'
+# Upper bounds of histogram buckets, in seconds unless a metric says otherwise
+TIME_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+BUCKETS = {
+    'partition_results': (0, 10, 50, 100, 150, 200, 249, 250),
+}
+HELP = {
+    'phase_seconds': 'Seconds spent per phase of the run',
+    'partition_results': 'Markets returned per searched partition',
+    'requests_total': 'HTTP requests sent, by endpoint and status',
+    'response_bytes_total': 'Response body bytes downloaded, by endpoint',
+    'rate_limit_wait_seconds_total': 'Seconds slept by the shared rate limiter',
+    'partitions_total': 'Finished partitions, by outcome',
+    'cap_hits_total': 'Searches that returned the result cap',
+    'cache_lookups_total': 'Cache lookups, by cache and result',
+    'rows_written_total': 'Rows written, by sink',
+    'duplicates_total': 'Markets dropped as already fetched',
+    'charts_total': 'Charts handled, by result',
+    'sheets_api_calls_total': 'Google Sheets API calls, by kind and status',
+}
+
+
+class Histogram:
+    """
+    Count, sum, min, max and cumulative bucket counts of observed values.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def quantile(self, q):
+        """
+        Estimate from the buckets: the upper bound of the bucket holding the q-th value.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        for bound, count in zip(self.buckets, self.counts):
+            if count >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {'count': self.count, 'sum': self.sum, 'min': self.min, 'max': self.max,
+                'buckets': dict(zip((str(bound) for bound in self.buckets), self.counts))}
+
+
+class Metrics:
+    """
+    Thread-safe registry of labelled counters and histograms for one run.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+            self.histograms = {}
+            self.started = time.monotonic()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(BUCKETS.get(name, TIME_BUCKETS))
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, phase):
+        """
+        Time the block into phase_seconds{phase=...}, also when it raises.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('phase_seconds', time.perf_counter() - started, phase=phase)
+
+    def counter(self, name, **labels):
+        """
+        Sum of a counter over every label set matching `labels`.
+        """
+        with self.lock:
+            return sum(value for (key, key_labels), value in self.counters.items()
+                       if key == name and set(labels.items()) <= set(key_labels))
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'elapsed_seconds': time.monotonic() - self.started,
+                'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                             for (name, labels), value in sorted(self.counters.items())],
+                'histograms': [dict({'name': name, 'labels': dict(labels)}, **histogram.to_dict())
+                               for (name, labels), histogram in sorted(self.histograms.items())],
+            }
+
+    def to_prometheus(self):
+        """
+        Prometheus text exposition format, for node_exporter's textfile collector.
+        """
+        lines = []
+        described = set()
+
+        def describe(name, kind):
+            if name not in described:
+                described.add(name)
+                if name in HELP:
+                    lines.append(f"# HELP {NAMESPACE}_{name} {HELP[name]}")
+                lines.append(f"# TYPE {NAMESPACE}_{name} {kind}")
+
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                describe(name, 'counter')
+                lines.append(f"{NAMESPACE}_{name}{_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                describe(name, 'histogram')
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f"{NAMESPACE}_{name}_bucket{_labels(labels + (('le', bound),))} {count}")
+                lines.append(f"{NAMESPACE}_{name}_bucket{_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+                lines.append(f"{NAMESPACE}_{name}_sum{_labels(labels)} {histogram.sum}")
+                lines.append(f"{NAMESPACE}_{name}_count{_labels(labels)} {histogram.count}")
+            elapsed = time.monotonic() - self.started
+        lines.append(f"# TYPE {NAMESPACE}_run_seconds gauge")
+        lines.append(f"{NAMESPACE}_run_seconds {elapsed}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """
+        Atomically write the metrics as JSON, or as a Prometheus textfile for *.prom.
+        """
+        folder = os.path.dirname(path) or '.'
+        os.makedirs(folder, exist_ok=True)
+        if path.endswith('.prom'):
+            content = self.to_prometheus()
+        else:
+            content = json.dumps(self.snapshot(), indent=2, default=str)
+        fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(content)
+        # mkstemp creates 0600 files; collectors such as node_exporter run as another user
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+
+    def summary_table(self, title="Run metrics"):
+        """
+        One row per phase (count, total, mean, p50, p95, max) followed by the counters.
+        """
+        snapshot = self.snapshot()
+        table = Table(title=f"{title} ({snapshot['elapsed_seconds']:.1f}s)")
+        for column in ('Metric', 'Count', 'Total', 'Mean', 'p50', 'p95', 'Max'):
+            table.add_column(column, justify='left' if column == 'Metric' else 'right',
+                             overflow='fold' if column == 'Metric' else 'ellipsis')
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+        for (name, labels), histogram in histograms:
+            seconds = name.endswith('_seconds')
+            fmt = _seconds if seconds else _number
+            table.add_row(f"{name}{_labels(labels)}", f"{histogram.count:,}", fmt(histogram.sum),
+                          fmt(histogram.sum / histogram.count), fmt(histogram.quantile(0.5)),
+                          fmt(histogram.quantile(0.95)), fmt(histogram.max))
+        for counter in snapshot['counters']:
+            value = counter['value']
+            total = _seconds(value) if counter['name'].endswith('_seconds_total') else f"{value:,}"
+            table.add_row(f"{counter['name']}{_labels(tuple(counter['labels'].items()))}", '', total, '', '', '', '')
+        return table
+
+    def report(self, logger, path):
+        """
+        Write the metrics file and log the summary table (rendered on the console only).
+        """
+        self.write(path)
+        logger.info(f"Metrics written to {path}", extra={'fields': {'event': 'metrics', 'path': path},
+                                                         'renderable': self.summary_table()})
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels) + '}'
+
+
+def _seconds(value):
+    if value is None:
+        return ''
+    return f"{value:.2f}s" if value >= 1 else f"{value * 1000:.1f}ms"
+
+
+def _number(value):
+    return '' if value is None else f"{value:,.1f}"
+
+
+METRICS = Metrics()
+
+
+@contextmanager
+def profiled(path, logger=None, top=25):
+    """
+    Run the block under cProfile and dump the stats to `path` (read them with
+    `python3 -m pstats path`). Before Python 3.12 a profiler only sees its own
+    thread, so threads started inside the block get their own profiler, merged into
+    the dump, and pooled workers are not missed. From 3.12 cProfile sees every thread.
+    """
+    profiles = []
+    lock = threading.Lock()
+
+    def profile_thread(frame, event, arg):
+        # Replaced by the thread's profiler, or dropped, after the first event
+        sys.setprofile(None)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already active in this interpreter
+            return
+        with lock:
+            profiles.append(profile)
+
+    per_thread = sys.version_info < (3, 12)
+    main_profile = cProfile.Profile()
+    if per_thread:
+        threading.setprofile(profile_thread)
+    main_profile.enable()
+    try:
+        yield main_profile
+    finally:
+        main_profile.disable()
+        if per_thread:
+            threading.setprofile(None)
+        stats = pstats.Stats(main_profile)
+        with lock:
+            for profile in profiles:
+                stats.add(profile)
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        stats.dump_stats(path)
+        if logger:
+            stream = io.StringIO()
+            stats.stream = stream
+            stats.sort_stats('cumulative').print_stats(top)
+            logger.info(f"Profile written to {path}, view it with: python3 -m pstats {path}",
+                        extra={'fields': {'event': 'profile', 'path': path}, 'renderable': Text(stream.getvalue())})
@@ -0,0 +1,119 @@
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# getMatchingMkts never returns more than this many markets for one query
+RESULT_CAP = 250
+ALL_STATES = ('ACT', 'NSW', 'NT', 'QLD', 'SA', 'TAS', 'VIC', 'WA')
+
+
+class Partition(namedtuple('Partition', 'states min_dsr max_dsr min_renters max_renters')):
+    """
+    One bucket of the (state, DSR, renters) search space.
+    DSR bounds are inclusive integers, renters bounds are percentages.
+    """
+    __slots__ = ()
+
+    @property
+    def state_value(self):
+        return ','.join(self.states)
+
+    def split(self):
+        """
+        Bisect the bucket along the first dimension that can still be split:
+        states, then DSR, then renters. Returns [] for an unsplittable leaf.
+        """
+        if len(self.states) > 1:
+            mid = len(self.states) // 2
+            return [self._replace(states=self.states[:mid]), self._replace(states=self.states[mid:])]
+        if self.min_dsr < self.max_dsr:
+            mid = (self.min_dsr + self.max_dsr) // 2
+            return [self._replace(max_dsr=mid), self._replace(min_dsr=mid + 1)]
+        if self.max_renters - self.min_renters > 1:
+            # Renters is a percentage, not an integer, so the halves share their boundary
+            mid = (self.min_renters + self.max_renters) // 2
+            return [self._replace(max_renters=mid), self._replace(min_renters=mid)]
+        return []
+
+    def __str__(self):
+        return f"DSR {self.min_dsr}-{self.max_dsr} in {self.state_value} with renters {self.min_renters}-{self.max_renters}"
+
+
+class SweepReport:
+    def __init__(self):
+        self.requests = 0
+        self.leaves = 0
+        self.splits = 0
+        self.records = 0
+        self.resumed = 0
+        self.truncated = []
+
+    def __str__(self):
+        return (f"{self.requests} requests, {self.splits} splits, {self.leaves} leaves, "
+                f"{self.records} records, {len(self.truncated)} truncated leaves, "
+                f"{self.resumed} partitions resumed from the journal")
+
+
+def is_capped(records):
+    return len(records) >= RESULT_CAP
+
+
+def sweep(fetch, roots, on_leaf=None, workers=1, on_split=None, completed=None):
+    """
+    Fetch each bucket once and bisect only the buckets that hit RESULT_CAP.
+
+    fetch(partition) returns the list of records for a bucket and runs on a pool of
+    `workers` threads, so at most that many requests are in flight; pacing is left to
+    the rate limiter inside fetch. on_leaf(partition, records) is called on the calling
+    thread for every bucket whose records are kept, and on_split(partition, records) for
+    every bucket that was bisected. Buckets that are still capped but cannot be split
+    are kept as well and listed in report.truncated.
+
+    completed maps partitions finished by an earlier run to their status ('leaf',
+    'truncated' or 'split'): finished leaves are skipped (truncated ones still listed
+    in report.truncated) and finished splits are expanded without fetching them again.
+    """
+    report = SweepReport()
+    completed = completed or {}
+    pool = ThreadPoolExecutor(max_workers=workers)
+    pending = {}
+
+    def submit(partition):
+        status = completed.get(partition)
+        if status == 'split':
+            report.resumed += 1
+            for child in partition.split():
+                submit(child)
+        elif status:
+            report.resumed += 1
+            # Still incomplete after the resume, so it belongs in the coverage report
+            if status == 'truncated':
+                report.truncated.append(partition)
+        else:
+            pending[pool.submit(fetch, partition)] = partition
+
+    try:
+        for partition in roots:
+            submit(partition)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                partition = pending.pop(future)
+                records = future.result()
+                report.requests += 1
+                if is_capped(records):
+                    children = partition.split()
+                    if children:
+                        report.splits += 1
+                        if on_split:
+                            on_split(partition, records)
+                        for child in children:
+                            submit(child)
+                        continue
+                    report.truncated.append(partition)
+                report.leaves += 1
+                report.records += len(records)
+                if on_leaf:
+                    on_leaf(partition, records)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+    return report
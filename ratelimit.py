@@ -0,0 +1,38 @@
+import random
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by every worker that talks to one host.
+    rate is in requests per second, burst is the bucket size and jitter adds a
+    random 0..jitter second delay on top of every acquired slot.
+    """
+
+    def __init__(self, rate, burst=1, jitter=0.0):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self.jitter = max(0.0, float(jitter))
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until a request may be sent and return the number of seconds waited.
+        Callers reserve their slot under the lock, so waiters are served in order.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if self.jitter:
+            wait += random.uniform(0, self.jitter)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
@@ -0,0 +1,202 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+
+from client import create_session
+from metrics import METRICS
+
+TOKEN_TAG_RE = re.compile(r'<[^>]*\bid=["\']accesstoken["\'][^>]*>', re.I)
+VALUE_RE = re.compile(r'\bvalue=["\']([^"\']*)["\']', re.I)
+EMAIL_RE = re.compile(r'<div[^>]*\bclass=["\'][^"\']*\bemail\b[^"\']*["\'][^>]*>(.*?)</div>', re.I | re.S)
+PASSWORD_RE = re.compile(r'<input[^>]*\btype=["\']password["\']', re.I)
+AUTH_STATUSES = (401, 403)
+
+
+class AuthError(Exception):
+    """
+    Raised when the cookies in cookies.json no longer belong to a logged-in session.
+    """
+
+
+def load_cookies(path):
+    """
+    Read a browser cookie export (Chrome/Firefox JSON list) into a name -> value dict.
+    """
+    try:
+        with open(path, 'r') as f:
+            return {cookie['name']: cookie['value'] for cookie in json.load(f)}
+    except FileNotFoundError:
+        raise AuthError(f"Cookie file '{path}' does not exist")
+    except (ValueError, KeyError, TypeError) as e:
+        raise AuthError(f"Cookie file '{path}' is not a cookie export: {e}")
+
+
+def parse_homepage(html):
+    """
+    Pull (access_token, email) out of the homepage with two regex scans instead of a
+    full HTML parse. Either is None when the page is not the logged-in homepage.
+    """
+    token = email = None
+    tag = TOKEN_TAG_RE.search(html)
+    if tag:
+        value = VALUE_RE.search(tag.group(0))
+        token = value.group(1) if value else None
+    match = EMAIL_RE.search(html)
+    if match:
+        email = re.sub(r'<[^>]+>', '', match.group(1)).strip() or None
+    return token, email
+
+
+def is_auth_failure(response):
+    """
+    401/403, or the login form served in place of the data.
+    """
+    if response.status_code in AUTH_STATUSES:
+        return True
+    return 'html' in response.headers.get('Content-Type', '') and PASSWORD_RE.search(response.text) is not None
+
+
+class SessionManager:
+    """
+    One pooled session and access token shared by every request of a run.
+
+    validate() reuses a token validated less than max_age seconds ago with the same
+    cookies (kept in cache_path) and otherwise scrapes it from the homepage. request()
+    adds the token, and on an auth failure re-reads cookies.json, re-validates once
+    and replays the request; if that fails too it raises AuthError, and so does every
+    later request, so a dead session stops the run instead of writing empty results.
+    """
+
+    def __init__(self, base_url, headers=None, cookies_path='cookies.json', pool_size=10, limiter=None,
+                 cache_path=os.path.join('.cache', 'session.json'), max_age=1800):
+        self.base_url = base_url.rstrip('/')
+        self.headers = headers
+        self.cookies_path = cookies_path
+        self.pool_size = pool_size
+        self.limiter = limiter
+        self.cache_path = cache_path
+        self.max_age = max_age
+        self.session = None
+        self.fingerprint = None
+        self.token = None
+        self.email = None
+        self.validated_at = None
+        self.generation = 0
+        self.dead = None
+        self.lock = threading.Lock()
+
+    def connect(self):
+        """
+        (Re)build the pooled session from the cookies currently in cookies_path.
+        """
+        cookies = load_cookies(self.cookies_path)
+        blob = json.dumps(cookies, sort_keys=True).encode('utf-8')
+        self.fingerprint = hashlib.sha256(blob).hexdigest()
+        self.session = create_session(self.headers, cookies, pool_size=self.pool_size)
+
+    def validate(self, force=False):
+        """
+        Make sure a live token is held, returning the logged-in email. Raises AuthError.
+        """
+        with self.lock:
+            self._validate(force)
+            return self.email
+
+    def _validate(self, force):
+        self.connect()
+        if not force and self._load_cached():
+            return
+        response = self._send('GET', f"{self.base_url}/")
+        token, email = parse_homepage(response.text)
+        if not (token and email):
+            self._forget_cached()
+            raise AuthError(f"The cookies in '{self.cookies_path}' are not logged in, export fresh ones from the browser")
+        self.token, self.email, self.validated_at = token, email, time.time()
+        self.generation += 1
+        self._store_cached()
+
+    def _load_cached(self):
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return False
+        if (cached.get('base_url') != self.base_url or cached.get('fingerprint') != self.fingerprint
+                or time.time() - cached.get('validated_at', 0) > self.max_age):
+            return False
+        self.token, self.email, self.validated_at = cached['token'], cached['email'], cached['validated_at']
+        self.generation += 1
+        return True
+
+    def _store_cached(self):
+        folder = os.path.dirname(self.cache_path) or '.'
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'base_url': self.base_url, 'fingerprint': self.fingerprint, 'token': self.token,
+                       'email': self.email, 'validated_at': self.validated_at}, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def _forget_cached(self):
+        try:
+            os.remove(self.cache_path)
+        except FileNotFoundError:
+            pass
+
+    def _send(self, method, url, **kwargs):
+        if self.limiter:
+            METRICS.inc('rate_limit_wait_seconds_total', self.limiter.acquire(), limiter='requests')
+        endpoint = urlparse(url).path.rstrip('/').rsplit('/', 1)[-1] or 'home'
+        with METRICS.timer('request'):
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.RequestException:
+                METRICS.inc('requests_total', endpoint=endpoint, status='error')
+                raise
+        # Attempts urllib3 already retried (429s, 5xx) are only visible in the retry history
+        retries = getattr(response.raw, 'retries', None)
+        for attempt in (retries.history if retries else ()):
+            METRICS.inc('requests_total', endpoint=endpoint, status=str(attempt.status or 'error'))
+        METRICS.inc('requests_total', endpoint=endpoint, status=str(response.status_code))
+        METRICS.inc('response_bytes_total', len(response.content), endpoint=endpoint)
+        return response
+
+    def request(self, method, url, params=None, **kwargs):
+        """
+        Send an authenticated request; see the class docstring for auth failures.
+        """
+        if self.dead:
+            raise self.dead
+        generation = self.generation
+        response = self._send(method, url, params=dict(params or {}, access_token=self.token), **kwargs)
+        if not is_auth_failure(response):
+            return response
+        with self.lock:
+            if self.dead:
+                raise self.dead
+            # Another worker may already have re-validated while this request was in flight
+            if self.generation == generation:
+                try:
+                    self._validate(force=True)
+                except AuthError as e:
+                    self.dead = e
+                    raise
+        response = self._send(method, url, params=dict(params or {}, access_token=self.token), **kwargs)
+        if is_auth_failure(response):
+            self.dead = AuthError(f"{method} {url} is still unauthorised ({response.status_code}) after logging in again")
+            self._forget_cached()
+            raise self.dead
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
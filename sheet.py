@@ -1,60 +1,186 @@
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv
-from rich import print
+from contextlib import contextmanager
+import hashlib
+import httplib2
+import json
+import random
+import time
 import pandas as pd
 import numpy as np
+from ratelimit import TokenBucket
+from logger import get_logger, level_for, log_event, setup_logging
+from metrics import METRICS
 
 SCOPES = [
     "https://www.googleapis.com/auth/spreadsheets",
 ]
+# Lets get_existing_data() read the spreadsheet's Drive revision to validate its cache.
+# Requested for new tokens only; tokens without it still work, just without the cache.
+REVISION_SCOPE = "https://www.googleapis.com/auth/drive.metadata.readonly"
+KEY_COLUMNS = ('State', 'Post Code', 'Property Type', 'Suburb')
+RETRY_STATUSES = (429, 500, 502, 503)
+LOG = get_logger('sheet')
+
+def column_letter(index):
+    """
+    1-based column index to A1 letters: 1 -> A, 26 -> Z, 27 -> AA.
+    """
+    letters = ''
+    while index > 0:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+def cell_value(value):
+    """
+    Convert NaN, None, and other problematic values to empty string, everything else to str.
+    """
+    if value is None or pd.isna(value) or str(value).lower() == 'nan':
+        return ''
+    # Convert to string to ensure JSON serialization
+    return str(value)
+
+def dataframe_values(df):
+    """
+    Header row plus data rows for a DataFrame, built column-wise: NaN/None/inf become
+    '' and numbers stay numbers (plain Python int/float, so the payload serializes).
+    """
+    df = df.replace([np.inf, -np.inf], np.nan)
+    for column in df.select_dtypes(include=['datetime', 'datetimetz', 'timedelta']).columns:
+        df[column] = df[column].astype(str).where(df[column].notna())
+    values = df.astype(object).where(df.notna(), '')
+    return [[str(column) for column in df.columns]] + values.to_numpy().tolist()
+
+def clear_outside_requests(sheet_gid, rows, cols):
+    """
+    updateCells requests clearing the cells below and to the right of a rows x cols table at A1.
+    """
+    return [
+        {'updateCells': {'range': grid_range, 'fields': 'userEnteredValue'}}
+        for grid_range in (
+            {'sheetId': sheet_gid, 'startRowIndex': rows},
+            {'sheetId': sheet_gid, 'startRowIndex': 0, 'endRowIndex': rows, 'startColumnIndex': cols},
+        )
+    ]
+
+def delete_rows_requests(sheet_gid, rows):
+    """
+    deleteDimension requests removing the given 0-based row indexes, merged into runs
+    and ordered bottom-up so each deletion leaves the rows above it in place.
+    """
+    runs = []
+    for row in sorted(rows):
+        if runs and runs[-1][1] == row:
+            runs[-1][1] = row + 1
+        else:
+            runs.append([row, row + 1])
+    return [
+        {'deleteDimension': {'range': {'sheetId': sheet_gid, 'dimension': 'ROWS', 'startIndex': start, 'endIndex': end}}}
+        for start, end in reversed(runs)
+    ]
+
+class WriteBatch:
+    """
+    Writes collected by SheetManager.batch_writes(): tabs to add and sheet-level
+    requests go out in one spreadsheets.batchUpdate, value ranges in one values.batchUpdate.
+    Tables too large for one request are uploaded in chunks after that.
+    """
+    def __init__(self):
+        self.add_sheets = []
+        self.requests = []
+        self.data = []
+        self.uploads = []
+
+class UploadProgress:
+    """
+    Committed chunk numbers of one table upload, kept on disk until the upload
+    finishes so a failed upload resumes instead of restarting.
+    """
+    def __init__(self, folder, sheet_id, sheet_name, all_values):
+        digest = hashlib.sha256(json.dumps(all_values, default=str).encode('utf-8')).hexdigest()[:16]
+        safe_name = ''.join(c if c.isalnum() else '_' for c in sheet_name)
+        self.path = os.path.join(folder, f"{sheet_id}_{safe_name}_{digest}.json")
+        self.committed = set()
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                self.committed = set(json.load(f)['committed'])
+
+    def mark(self, chunk):
+        self.committed.add(chunk)
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'committed': sorted(self.committed)}, f)
+        os.replace(tmp_path, self.path)
+
+    def done(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
 
 class SheetManager:
-    def __init__(self, title, creds_path='credentials.json', token_path='token.json'):
+    def __init__(self, title, creds_path='credentials.json', token_path='token.json',
+                 chunk_rows=5000, writes_per_minute=60, max_retries=5, progress_dir='.sheet_uploads',
+                 api_endpoint=None, sheet_id=None):
+        """
+        api_endpoint points the client at another Sheets API host (e.g. fake_sheets.FakeSheetsServer)
+        and skips OAuth; sheet_id overrides SHEET_ID from .env.
+        """
         self.title = title
         self.creds_path = creds_path
         self.token_path = token_path
-        self.creds = self.get_creds(token_path)
-        self.service = self.connect_to_sheets(self.creds)
-        self.sheet_id = self.ensure_sheet(title)
+        self.api_endpoint = api_endpoint
+        self.chunk_rows = chunk_rows
+        self.max_retries = max_retries
+        self.progress_dir = progress_dir
+        # Sheets allows 60 write requests per minute per user by default
+        self.write_quota = TokenBucket(rate=writes_per_minute / 60, burst=1)
+        self.tab_cache = {}  # sheet_name -> rows as last read or written by this manager
+        self.tabs = {}  # tab title -> sheetId (gid), refreshed only on a miss
+        self.batch = None
+        self.key_cache_dir = '.sheet_cache'
+        self.tab_headers = {}  # sheet_name -> header row, from get_existing_data
+        self.row_counts = {}  # sheet_name -> data rows below the header, from get_existing_data
+        if api_endpoint:
+            self.creds = None
+            self.service = self.connect_to_endpoint(api_endpoint)
+            self.drive = None
+        else:
+            self.creds = self.get_creds(token_path)
+            self.service = self.connect_to_sheets(self.creds)
+            self.drive = self.connect_to_drive(self.creds)
+        self.sheet_id = self.ensure_sheet(title, sheet_id)
 
     def time_now(self):
         return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
-    def print_info(self, msg, mtype='INF'):
-        if mtype == 'INF':
-            print(f"[green]{self.time_now()} [INF][/green] {msg}")
-        elif mtype == 'ERR':
-            self.log_error(msg)
-            print(f"[red]{self.time_now()} [ERR][/red] {msg}")
-        elif mtype == 'WRN':
-            print(f"[yellow]{self.time_now()} [WRN][/yellow] {msg}")
-        else:
-            print(f"[{mtype}] {msg}")
-
-    def log_error(self, msg):
-        with open("error.log", "a") as f:
-            f.write(f"{self.time_now()} [ERR] {msg}\n")
+    def print_info(self, msg, mtype='INF', **fields):
+        log_event(LOG, level_for(mtype), msg, **fields)
 
     def get_creds(self, token_file="token.json"):
         self.print_info('Getting token for Google APIs...')
         if os.path.exists(token_file):
-            return Credentials.from_authorized_user_file(token_file, SCOPES)
-        flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
+            # Keep the scopes the token was granted, so older tokens still refresh
+            return Credentials.from_authorized_user_file(token_file)
+        flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES + [REVISION_SCOPE])
         creds = flow.run_local_server(port=0)
         with open(token_file, "w") as f:
             f.write(creds.to_json())
         return creds
 
-    def ensure_sheet(self, title):
-        load_dotenv()
-        sheet_id = os.environ.get("SHEET_ID")
+    def ensure_sheet(self, title, sheet_id=None):
+        if not sheet_id:
+            load_dotenv()
+            sheet_id = os.environ.get("SHEET_ID")
         try:
             if sheet_id:
-                self.service.spreadsheets().get(spreadsheetId=sheet_id).execute()
+                spreadsheet = self.service.spreadsheets().get(spreadsheetId=sheet_id).execute()
+                self.register_tabs(spreadsheet)
                 # print_info(f"Sheet exists: https://docs.google.com/spreadsheets/d/{SHEET_ID}/edit")
                 return sheet_id
         except Exception as e:
@@ -65,7 +191,10 @@ class SheetManager:
             }
             sheet = self.service.spreadsheets().create(body=spreadsheet).execute()
             new_sheet_id = sheet['spreadsheetId']
+            self.register_tabs(sheet)
             self.print_info(f"Created new sheet: https://docs.google.com/spreadsheets/d/{new_sheet_id}/edit")
+            if self.api_endpoint:
+                return new_sheet_id
             # Save new SHEET_ID to .env
             env_path = ".env"
             if os.path.exists(env_path):
@@ -96,22 +225,197 @@ class SheetManager:
             self.print_info(f"Error connecting to Google Sheets API: {e}", mtype='ERR')
             return None
         
+    def execute(self, request, write=True):
+        """
+        Execute an API request, backing off exponentially with jitter on 429 and
+        transient 5xx responses. Writes are also paced by the per-minute write quota.
+        """
+        method = getattr(request, 'methodId', None) or 'unknown'
+        for attempt in range(self.max_retries + 1):
+            if write:
+                METRICS.inc('rate_limit_wait_seconds_total', self.write_quota.acquire(), limiter='sheets_writes')
+            try:
+                with METRICS.timer('sheets_api'):
+                    result = request.execute()
+                METRICS.inc('sheets_api_calls_total', method=method, status='200')
+                return result
+            except HttpError as e:
+                METRICS.inc('sheets_api_calls_total', method=method, status=str(e.resp.status))
+                if e.resp.status not in RETRY_STATUSES or attempt == self.max_retries:
+                    raise
+                delay = min(64, 2 ** attempt) + random.uniform(0, 1)
+                self.print_info(f"Sheets API returned {e.resp.status}, retrying in {delay:.1f}s", mtype='WRN',
+                                event='retry', status=e.resp.status, attempt=attempt + 1, delay=round(delay, 2))
+                time.sleep(delay)
+
+    def register_tabs(self, spreadsheet):
+        for sheet in spreadsheet.get('sheets', []):
+            self.tabs[sheet['properties']['title']] = sheet['properties']['sheetId']
+
+    def lookup_sheet(self, sheet_name):
+        """
+        Return the sheet ID (gid) of a tab, refreshing the tab registry only on a miss.
+        """
+        if sheet_name not in self.tabs:
+            spreadsheet = self.execute(self.service.spreadsheets().get(
+                spreadsheetId=self.sheet_id,
+                fields='sheets.properties(sheetId,title)'
+            ), write=False)
+            self.register_tabs(spreadsheet)
+        return self.tabs.get(sheet_name)
+
+    def connect_to_endpoint(self, api_endpoint):
+        try:
+            service = build('sheets', 'v4', http=httplib2.Http(), static_discovery=True,
+                            client_options={'api_endpoint': api_endpoint})
+            self.print_info(f"Connected to Sheets API at {api_endpoint}")
+            return service
+        except Exception as e:
+            self.print_info(f"Error connecting to Sheets API at {api_endpoint}: {e}", mtype='ERR')
+            return None
+
+    def connect_to_drive(self, creds):
+        if not creds or not creds.has_scopes([REVISION_SCOPE]):
+            return None
+        try:
+            return build('drive', 'v3', credentials=creds)
+        except Exception as e:
+            self.print_info(f"Error connecting to Google Drive API: {e}", mtype='WRN')
+            return None
+
+    def sheet_version(self):
+        """
+        Drive revision number of the spreadsheet, or None when it can't be read.
+        """
+        if not self.drive:
+            return None
+        try:
+            return self.drive.files().get(fileId=self.sheet_id, fields='version').execute().get('version')
+        except Exception as e:
+            self.print_info(f"Could not read spreadsheet revision: {e}", mtype='WRN')
+            return None
+
+    def get_existing_data(self, sheet_name='dsr_data', key_columns=KEY_COLUMNS, page_rows=10000, use_cache=True):
+        """
+        Return the set of key tuples (as strings) already present in a tab.
+        Only the key columns are read, page_rows rows per request. The result is
+        cached under key_cache_dir and reused while the spreadsheet's Drive revision
+        is unchanged. Without a connection, or when a read fails, the error is logged
+        and an empty set returned.
+        """
+        if not self.connected():
+            return set()
+        try:
+            return self.read_keys(sheet_name, list(key_columns), page_rows, use_cache)
+        except Exception as e:
+            self.print_info(f"Error reading existing keys from Google Sheet '{sheet_name}': {e}", mtype='ERR')
+            return set()
+
+    def read_keys(self, sheet_name, key_columns, page_rows, use_cache):
+        if self.lookup_sheet(sheet_name) is None:
+            self.tab_headers[sheet_name] = []
+            self.row_counts[sheet_name] = 0
+            return set()
+
+        version = self.sheet_version() if use_cache else None
+        safe_name = ''.join(c if c.isalnum() else '_' for c in sheet_name)
+        cache_path = os.path.join(self.key_cache_dir, f"{self.sheet_id}_{safe_name}.json")
+        if version and os.path.exists(cache_path):
+            with open(cache_path, 'r') as f:
+                cached = json.load(f)
+            if cached['version'] == version and cached['key_columns'] == key_columns:
+                self.tab_headers[sheet_name] = cached['header']
+                self.row_counts[sheet_name] = cached['rows']
+                self.print_info(f"Using cached keys for '{sheet_name}' at revision {version}")
+                return set(tuple(key) for key in cached['keys'])
+
+        result = self.execute(self.service.spreadsheets().values().get(
+            spreadsheetId=self.sheet_id,
+            range=f"{sheet_name}!1:1"
+        ), write=False)
+        header = (result.get('values') or [[]])[0]
+        self.tab_headers[sheet_name] = header
+        missing = [column for column in key_columns if column not in header]
+        if missing:
+            self.row_counts[sheet_name] = 0
+            if header:
+                self.print_info(f"Sheet '{sheet_name}' has no key column(s) {missing}", mtype='WRN')
+            return set()
+
+        letters = [column_letter(header.index(column) + 1) for column in key_columns]
+        keys = set()
+        rows = 0
+        start = 2
+        while True:
+            end = start + page_rows - 1
+            result = self.execute(self.service.spreadsheets().values().batchGet(
+                spreadsheetId=self.sheet_id,
+                ranges=[f"{sheet_name}!{letter}{start}:{letter}{end}" for letter in letters],
+                majorDimension='COLUMNS',
+                valueRenderOption='UNFORMATTED_VALUE'
+            ), write=False)
+            columns = [(value_range.get('values') or [[]])[0] for value_range in result.get('valueRanges', [])]
+            page = max(len(column) for column in columns)
+            if page == 0:
+                break
+            columns = [column + [''] * (page - len(column)) for column in columns]
+            keys.update(tuple(str(value) for value in row) for row in zip(*columns))
+            rows = start - 2 + page
+            if page < page_rows:
+                break
+            start += page_rows
+        self.row_counts[sheet_name] = rows
+
+        if version:
+            os.makedirs(self.key_cache_dir, exist_ok=True)
+            with open(cache_path, 'w') as f:
+                json.dump({'version': version, 'key_columns': key_columns, 'header': header,
+                           'rows': rows, 'keys': sorted(keys)}, f)
+        self.print_info(f"Read {len(keys)} existing keys from '{sheet_name}'")
+        return keys
+
+    def append_dataframe(self, df, sheet_name):
+        """
+        Append DataFrame rows below the rows counted by get_existing_data(), which is
+        called first if needed. Rewrites the tab when it is empty or its header differs.
+        """
+        if not self.can_write(df):
+            return
+        try:
+            if sheet_name not in self.row_counts:
+                self.get_existing_data(sheet_name, key_columns=[str(df.columns[0])], use_cache=False)
+            all_values = dataframe_values(df)
+            rows = self.row_counts[sheet_name]
+            if self.tab_headers.get(sheet_name) != all_values[0]:
+                self.write_table(all_values, sheet_name)
+                self.row_counts[sheet_name] = len(all_values) - 1
+                self.tab_headers[sheet_name] = all_values[0]
+                return
+            request = {'range': f"{sheet_name}!A{rows + 2}", 'values': all_values[1:]}
+            if self.batch is not None:
+                self.batch.data.append(request)
+            else:
+                self.execute(self.service.spreadsheets().values().update(
+                    spreadsheetId=self.sheet_id,
+                    valueInputOption="RAW",
+                    body={'values': request['values']},
+                    range=request['range']
+                ))
+            self.row_counts[sheet_name] = rows + len(all_values) - 1
+            self.tab_cache.pop(sheet_name, None)
+            self.print_info(f"Appended {len(all_values) - 1} rows to sheet '{sheet_name}'")
+        except Exception as e:
+            self.print_info(f"Error appending to Google Sheet '{sheet_name}': {e}", mtype='ERR')
+
     def get_or_create_sheet(self, sheet_name):
         """
         Get sheet ID by name, or create it if it doesn't exist.
         Returns the sheet ID (gid) of the specified sheet.
         """
         try:
-            # Get spreadsheet metadata to check existing sheets
-            spreadsheet = self.service.spreadsheets().get(spreadsheetId=self.sheet_id).execute()
-            sheets = spreadsheet.get('sheets', [])
-            
-            # Check if sheet with given name already exists
-            for sheet in sheets:
-                if sheet['properties']['title'] == sheet_name:
-                    sheet_id = sheet['properties']['sheetId']
-                    self.print_info(f"Found existing sheet: {sheet_name}")
-                    return sheet_id
+            sheet_id = self.lookup_sheet(sheet_name)
+            if sheet_id is not None:
+                return sheet_id
             
             # Sheet doesn't exist, create it
             requests = [{
@@ -122,12 +426,13 @@ class SheetManager:
                 }
             }]
             
-            response = self.service.spreadsheets().batchUpdate(
+            response = self.execute(self.service.spreadsheets().batchUpdate(
                 spreadsheetId=self.sheet_id,
                 body={'requests': requests}
-            ).execute()
+            ))
             
             new_sheet_id = response['replies'][0]['addSheet']['properties']['sheetId']
+            self.tabs[sheet_name] = new_sheet_id
             self.print_info(f"Created new sheet: {sheet_name}")
             return new_sheet_id
             
@@ -135,6 +440,45 @@ class SheetManager:
             self.print_info(f"Error getting/creating sheet '{sheet_name}': {e}", mtype='ERR')
             return None
 
+    @contextmanager
+    def batch_writes(self):
+        """
+        Collect the writes of several log_batch_to_sheet/upsert_to_sheet calls and send
+        them on exit as one spreadsheets.batchUpdate (tab creation and clearing, if any)
+        plus one values.batchUpdate.
+        """
+        self.batch = WriteBatch()
+        try:
+            yield self.batch
+            batch = self.batch
+            self.batch = None
+            self.flush_batch(batch)
+        finally:
+            self.batch = None
+
+    def flush_batch(self, batch):
+        try:
+            requests = [{'addSheet': {'properties': {'title': title}}} for title in batch.add_sheets] + batch.requests
+            if requests:
+                response = self.execute(self.service.spreadsheets().batchUpdate(
+                    spreadsheetId=self.sheet_id,
+                    body={'requests': requests}
+                ))
+                for reply in response.get('replies', [])[:len(batch.add_sheets)]:
+                    properties = reply['addSheet']['properties']
+                    self.tabs[properties['title']] = properties['sheetId']
+            if batch.data:
+                result = self.execute(self.service.spreadsheets().values().batchUpdate(
+                    spreadsheetId=self.sheet_id,
+                    body={'valueInputOption': 'RAW', 'data': batch.data}
+                ))
+                self.print_info(f"Batch wrote {len(batch.data)} ranges: {result.get('totalUpdatedCells', 0)} cells updated")
+            for all_values, sheet_name in batch.uploads:
+                self.upload_table(all_values, sheet_name)
+        except Exception as e:
+            self.tab_cache.clear()
+            self.print_info(f"Error writing batch to Google Sheet: {e}", mtype='ERR')
+
     def log_to_sheet(self, info, sheet_name="Sheet1"):
         """
         Log data to sheet - handles both single dict and list of dicts
@@ -146,27 +490,46 @@ class SheetManager:
         else:
             self.print_info("Invalid data format. Expected dict or list of dicts", mtype='ERR')
 
-    def log_batch_to_sheet(self, data_list, sheet_name="Sheet1"):
+    def target_sheet(self, sheet_name):
         """
-        Log a list of dictionaries to sheet in a single batch operation.
+        Make sure a tab exists, or queue its creation when batching.
+        Returns its gid, or None when it will be created by the current batch.
         """
+        if self.batch is not None:
+            sheet_gid = None if sheet_name in self.batch.add_sheets else self.lookup_sheet(sheet_name)
+            if sheet_gid is None and sheet_name not in self.batch.add_sheets:
+                self.batch.add_sheets.append(sheet_name)
+            return sheet_gid
+        sheet_gid = self.get_or_create_sheet(sheet_name)
+        if sheet_gid is None:
+            raise RuntimeError(f"Failed to get or create sheet: {sheet_name}")
+        return sheet_gid
+
+    def connected(self):
         if not self.service:
             self.print_info("No valid Google Sheets connection", mtype='ERR')
-            return
+            return False
         if not self.sheet_id:
             self.print_info("No valid sheet ID", mtype='ERR')
-            return
-        if not data_list:
+            return False
+        return True
+
+    def can_write(self, data):
+        if not self.connected():
+            return False
+        if data is None or len(data) == 0:
             self.print_info("No data to log", mtype='WRN')
+            return False
+        return True
+
+    def log_batch_to_sheet(self, data_list, sheet_name="Sheet1"):
+        """
+        Log a list of dictionaries to sheet in a single batch operation.
+        """
+        if not self.can_write(data_list):
             return
         
         try:
-            # Ensure the sheet exists
-            sheet_gid = self.get_or_create_sheet(sheet_name)
-            if sheet_gid is None:
-                self.print_info(f"Failed to get or create sheet: {sheet_name}", mtype='ERR')
-                return
-            
             # Get headers from first dictionary
             headers = list(data_list[0].keys())
             
@@ -175,39 +538,201 @@ class SheetManager:
             
             # Add all data rows - handle NaN values
             for data in data_list:
-                row = []
-                for header in headers:
-                    value = data.get(header, '')
-                    # Convert NaN, None, and other problematic values to empty string
-                    if pd.isna(value) or value is None or str(value).lower() == 'nan':
-                        row.append('')
-                    else:
-                        # Convert to string to ensure JSON serialization
-                        row.append(str(value))
-                all_values.append(row)
-
-            # Clear and write everything
-            self.service.spreadsheets().values().clear(
-                spreadsheetId=self.sheet_id,
-                range=f"{sheet_name}!A:Z"
-            ).execute()
+                all_values.append([cell_value(data.get(header, '')) for header in headers])
+
+            self.write_table(all_values, sheet_name)
             
-            # Write all data
-            body = {'values': all_values}
-            result = self.service.spreadsheets().values().update(
+        except Exception as e:
+            self.print_info(f"Error batch logging to Google Sheet '{sheet_name}': {e}", mtype='ERR')
+
+    def log_dataframe(self, df, sheet_name="Sheet1"):
+        """
+        Log a DataFrame to sheet, keeping numbers as numbers so the sheet can sort
+        and filter them numerically.
+        """
+        if not self.can_write(df):
+            return
+        try:
+            self.write_table(dataframe_values(df), sheet_name)
+        except Exception as e:
+            self.print_info(f"Error logging DataFrame to Google Sheet '{sheet_name}': {e}", mtype='ERR')
+
+    def write_table(self, all_values, sheet_name):
+        """
+        Replace the tab's contents with all_values (header row first).
+        """
+        sheet_gid = self.target_sheet(sheet_name)
+        if self.batch is None:
+            self.upload_table(all_values, sheet_name, sheet_gid)
+            return
+        if len(all_values) > self.chunk_rows:
+            self.batch.uploads.append((all_values, sheet_name))
+            self.print_info(f"Queued chunked upload of {len(all_values) - 1} records for sheet '{sheet_name}'")
+            return
+        if sheet_gid is not None:
+            self.batch.requests.extend(clear_outside_requests(sheet_gid, len(all_values), len(all_values[0])))
+        self.batch.data.append({'range': f"{sheet_name}!A1", 'values': all_values})
+        self.tab_cache[sheet_name] = all_values
+        self.print_info(f"Queued {len(all_values) - 1} records for sheet '{sheet_name}'")
+
+    def upload_table(self, all_values, sheet_name, sheet_gid=None):
+        """
+        Write a table in chunks of chunk_rows rows, each sized to the header width.
+        Committed chunks are recorded under progress_dir, so re-running a failed
+        upload of the same table only sends the missing chunks. Cells left over
+        below or to the right of the table are cleared at the end.
+        """
+        if sheet_gid is None:
+            sheet_gid = self.target_sheet(sheet_name)
+        self.tab_cache.pop(sheet_name, None)
+        width = len(all_values[0])
+        last_column = column_letter(width)
+        progress = UploadProgress(self.progress_dir, self.sheet_id, sheet_name, all_values)
+        chunks = range(0, len(all_values), self.chunk_rows)
+        if progress.committed:
+            self.print_info(f"Resuming upload to '{sheet_name}': {len(progress.committed)}/{len(chunks)} chunks already committed")
+        cells_updated = 0
+        for chunk, start in enumerate(chunks):
+            if chunk in progress.committed:
+                continue
+            rows = all_values[start:start + self.chunk_rows]
+            result = self.execute(self.service.spreadsheets().values().update(
                 spreadsheetId=self.sheet_id,
-                range=f"{sheet_name}!A1",
+                range=f"{sheet_name}!A{start + 1}:{last_column}{start + len(rows)}",
                 valueInputOption="RAW",
-                body=body
-            ).execute()
-            
-            cells_updated = result.get('updatedCells', 0)
-            self.print_info(f"Batch logged {len(data_list)} records to sheet '{sheet_name}': {cells_updated} cells updated")
-            
+                body={'values': rows}
+            ))
+            cells_updated += result.get('updatedCells', 0)
+            progress.mark(chunk)
+            if len(chunks) > 1:
+                self.print_info(f"Uploaded chunk {chunk + 1}/{len(chunks)} to sheet '{sheet_name}'")
+        self.execute(self.service.spreadsheets().batchUpdate(
+            spreadsheetId=self.sheet_id,
+            body={'requests': clear_outside_requests(sheet_gid, len(all_values), width)}
+        ))
+        progress.done()
+        self.tab_cache[sheet_name] = all_values
+        self.print_info(f"Batch logged {len(all_values) - 1} records to sheet '{sheet_name}': {cells_updated} cells updated")
+
+    def read_tab(self, sheet_name, use_cache=True):
+        """
+        Return the tab's unformatted values as a list of rows, padded to the header width.
+        """
+        if use_cache and sheet_name in self.tab_cache:
+            return self.tab_cache[sheet_name]
+        result = self.execute(self.service.spreadsheets().values().get(
+            spreadsheetId=self.sheet_id,
+            range=sheet_name,
+            valueRenderOption='UNFORMATTED_VALUE'
+        ), write=False)
+        rows = result.get('values', [])
+        width = len(rows[0]) if rows else 0
+        rows = [row + [''] * (width - len(row)) for row in rows]
+        self.tab_cache[sheet_name] = rows
+        return rows
+
+    def upsert_to_sheet(self, data, sheet_name, key_columns, use_cache=True, prune=False):
+        """
+        Keyed delta sync of a list of dicts or a DataFrame: rows whose key already
+        exists are updated cell by cell where they differ, new keys are appended, and
+        everything goes out in one values.batchUpdate. Rows missing from data are left
+        untouched, or with prune=True deleted (deleteDimension) ahead of the value
+        updates, so the tab ends up holding exactly the keys in data. Falls back to a
+        full rewrite when the tab is empty or its header differs.
+        """
+        if not self.can_write(data):
+            return
+
+        try:
+            if isinstance(data, pd.DataFrame):
+                all_values = dataframe_values(data)
+            else:
+                headers = list(data[0].keys())
+                all_values = [headers] + [[cell_value(record.get(header, '')) for header in headers] for record in data]
+            headers = all_values[0]
+            sheet_gid = self.target_sheet(sheet_name)
+            current = self.read_tab(sheet_name, use_cache=use_cache) if sheet_gid is not None else []
+            if not current or current[0] != headers:
+                self.print_info(f"Sheet '{sheet_name}' is empty or its header changed, rewriting it", mtype='WRN')
+                self.write_table(all_values, sheet_name)
+                return
+
+            key_indexes = [headers.index(column) for column in key_columns]
+            row_key = lambda row: tuple(str(row[i]) if i < len(row) else '' for i in key_indexes)
+            deletes = []
+            removed = 0
+            if prune:
+                wanted = {row_key(row) for row in all_values[1:]}
+                stale = [number for number, row in enumerate(current) if number and row_key(row) not in wanted]
+                if stale:
+                    deletes = delete_rows_requests(sheet_gid, stale)
+                    removed = len(stale)
+                    stale = set(stale)
+                    current = [row for number, row in enumerate(current) if number not in stale]
+            row_numbers = {row_key(row): number for number, row in enumerate(current) if number}
+            current = [list(row) for row in current]
+            updates = []
+            appended = []
+            changed_cells = 0
+            for row in all_values[1:]:
+                number = row_numbers.get(row_key(row))
+                if number is None:
+                    row_numbers[row_key(row)] = len(current)
+                    current.append(row)
+                    appended.append(row)
+                    continue
+                existing = current[number]
+                # Coalesce runs of adjacent changed cells into one range each
+                col = 0
+                while col < len(headers):
+                    if row[col] == existing[col]:
+                        col += 1
+                        continue
+                    start = col
+                    while col < len(headers) and row[col] != existing[col]:
+                        col += 1
+                    updates.append({
+                        'range': f"{sheet_name}!{column_letter(start + 1)}{number + 1}:{column_letter(col)}{number + 1}",
+                        'values': [row[start:col]],
+                    })
+                    changed_cells += col - start
+                current[number] = row
+            if appended:
+                first_row = len(current) - len(appended) + 1
+                updates.append({'range': f"{sheet_name}!A{first_row}", 'values': appended})
+
+            if not (updates or deletes):
+                self.print_info(f"Sheet '{sheet_name}' is already up to date")
+                return
+            summary = f"{changed_cells} cells changed, {len(appended)} rows appended, {removed} rows removed"
+            # The tab's row count changed; append_dataframe re-reads it when needed
+            self.row_counts.pop(sheet_name, None)
+            if self.batch is not None:
+                # Sheet-level requests (the deletions) go out before the value ranges
+                self.batch.requests.extend(deletes)
+                self.batch.data.extend(updates)
+                self.tab_cache[sheet_name] = current
+                self.print_info(f"Queued sync of sheet '{sheet_name}': {summary}")
+                return
+            if deletes:
+                self.execute(self.service.spreadsheets().batchUpdate(
+                    spreadsheetId=self.sheet_id,
+                    body={'requests': deletes}
+                ))
+            if updates:
+                self.execute(self.service.spreadsheets().values().batchUpdate(
+                    spreadsheetId=self.sheet_id,
+                    body={'valueInputOption': 'RAW', 'data': updates}
+                ))
+            self.tab_cache[sheet_name] = current
+            self.print_info(f"Synced sheet '{sheet_name}': {summary}")
+
         except Exception as e:
-            self.print_info(f"Error batch logging to Google Sheet '{sheet_name}': {e}", mtype='ERR')
+            self.tab_cache.pop(sheet_name, None)
+            self.print_info(f"Error syncing Google Sheet '{sheet_name}': {e}", mtype='ERR')
 
 def main():
+    setup_logging()
     manager = SheetManager("DSR Data")
     sample_info = {
         "Timestamp": manager.time_now(),
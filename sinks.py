@@ -0,0 +1,69 @@
+import csv
+import os
+
+# Column order of every markets CSV, matching the columns of markets.MarketBatch
+MARKET_COLUMNS = [
+    'State',
+    'Post Code',
+    'Property Type',
+    'Suburb',
+    'Auction clearance rate',
+    'Avg vendor discount',
+    'Days on market',
+    'Demand to Supply Ratio',
+    'Median 12 months',
+    'Online search interest',
+    'Percent renters in market',
+    'Percent stock on market',
+    'Statistical reliability',
+    'Typical value',
+    'Vacancy rate',
+    'Gross rental yield',
+]
+
+
+class CsvSink:
+    """
+    Streaming CSV writer that keeps the output file open for the whole run.
+    The header is written once, rows are appended in the fixed `columns` order and
+    flush() makes everything written so far durable, so each write costs time
+    proportional to its own rows rather than to the whole file.
+    """
+
+    def __init__(self, path, columns=MARKET_COLUMNS, append=False):
+        self.path = path
+        self.columns = list(columns)
+        self.file = open(path, 'a' if append else 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.rows = 0
+        self.dirty = False
+        if self.file.tell() == 0:
+            self.writer.writerow(self.columns)
+            self.dirty = True
+
+    def write_rows(self, records):
+        """
+        Append a MarketBatch or a list of record dicts; keys outside `columns` are ignored.
+        """
+        if hasattr(records, 'to_frame'):
+            # Columnar batches are formatted by pandas; %.15g keeps integral stats as "45"
+            records.to_frame(self.columns).to_csv(self.file, header=False, index=False, na_rep='',
+                                                  float_format='%.15g', lineterminator='\r\n')
+        else:
+            self.writer.writerows([record.get(column) for column in self.columns] for record in records)
+        self.rows += len(records)
+        self.dirty = self.dirty or bool(records)
+
+    def flush(self):
+        """
+        Flush and fsync pending rows, returning the durable file offset.
+        """
+        if self.dirty:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.dirty = False
+        return self.file.tell()
+
+    def close(self):
+        self.flush()
+        self.file.close()
@@ -0,0 +1,97 @@
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from sinks import MARKET_COLUMNS
+
+STAT_COLUMNS = MARKET_COLUMNS[4:]
+PARTITIONING = ds.partitioning(pa.schema([('run_date', pa.string()), ('State', pa.string())]), flavor='hive')
+# Data columns stored in each file; run_date and State live in the directory names
+SCHEMA = pa.schema(
+    [
+        ('run_id', pa.string()),
+        ('Post Code', pa.string()),
+        ('Property Type', pa.dictionary(pa.int32(), pa.string())),
+        ('Suburb', pa.dictionary(pa.int32(), pa.string())),
+    ]
+    + [(column, pa.float64()) for column in STAT_COLUMNS]
+)
+
+
+def run_id_for(output_path):
+    """
+    markets_20250101_093000.csv -> 20250101_093000
+    """
+    name = os.path.splitext(os.path.basename(output_path))[0]
+    return name.replace('markets_', '', 1)
+
+
+def typed_markets(df):
+    """
+    Coerce a markets frame to the snapshot dtypes: numeric stats, string post codes
+    and categorical identity columns.
+    """
+    df = df.copy()
+    for column in STAT_COLUMNS:
+        df[column] = pd.to_numeric(df[column], errors='coerce').astype('float64')
+    df['Post Code'] = df['Post Code'].astype('string')
+    for column in ('State', 'Property Type', 'Suburb'):
+        df[column] = df[column].astype('category')
+    return df
+
+
+class SnapshotStore:
+    """
+    Parquet dataset with one partition per run date and state, e.g.
+    snapshots/run_date=2025-01-01/State=NSW/20250101_093000-0.parquet
+    """
+
+    def __init__(self, root='snapshots'):
+        self.root = root
+
+    def dataset(self):
+        return ds.dataset(self.root, format='parquet', partitioning=PARTITIONING)
+
+    def write(self, df, run_id):
+        df = typed_markets(df)
+        df['run_id'] = run_id
+        df['run_date'] = f"{run_id[0:4]}-{run_id[4:6]}-{run_id[6:8]}"
+        table = pa.Table.from_pandas(df[['run_date', 'State'] + SCHEMA.names], preserve_index=False)
+        table = table.cast(pa.schema([('run_date', pa.string()), ('State', pa.string())] + list(SCHEMA)))
+        pq.write_to_dataset(
+            table,
+            self.root,
+            partitioning=PARTITIONING,
+            basename_template=f"{run_id}-{{i}}.parquet",
+            existing_data_behavior='overwrite_or_ignore',
+            compression='zstd',
+        )
+        return len(df)
+
+    def read(self, states=None, run_ids=None, run_dates=None, columns=None):
+        """
+        Load snapshots as a DataFrame, reading only the requested columns and pruning
+        partitions by state and run date.
+        """
+        if not os.path.exists(self.root):
+            return pd.DataFrame(columns=columns or ['run_date', 'State'] + SCHEMA.names)
+        expression = None
+        for field, values in (('State', states), ('run_date', run_dates), ('run_id', run_ids)):
+            if values:
+                condition = ds.field(field).isin(list(values))
+                expression = condition if expression is None else expression & condition
+        table = self.dataset().to_table(columns=columns, filter=expression)
+        return table.to_pandas()
+
+    def run_ids(self):
+        if not os.path.exists(self.root):
+            return []
+        ids = self.dataset().to_table(columns=['run_id']).column('run_id').unique().to_pylist()
+        return sorted(ids)
+
+    def previous_run_id(self, run_id):
+        earlier = [other for other in self.run_ids() if other < run_id]
+        return earlier[-1] if earlier else None